@@ -1,213 +1,109 @@
+from startup import StartupTimer, BackgroundLoader
+startup_timer = StartupTimer()
+
 import os
 import tkinter as tk
 from tkinter.scrolledtext import ScrolledText
 from tkinter import ttk
-import threading
-from vosk import Model, KaldiRecognizer
-import json
-import sys
-import time
-import subprocess
-import yt_dlp
 import logging
-import argostranslate.package
-import argostranslate.translate
+import engine
+import metrics
+from render_queue import TranscriptRenderer
+from broadcast import CaptionBroadcaster
+from transcript_export import TranscriptWriter
 
-# Set up logging
-logging.basicConfig(filename='LiveTranslator.log', filemode='w', level=logging.DEBUG)
-logging.debug("Starting application...")
+startup_timer.mark('imports')
 
-# Global variables
-stop_translation_flag = False
-ffmpeg_process = None
-
-# Get the path to the directory where the script is located
-if getattr(sys, 'frozen', False):
-    application_path = os.path.dirname(sys.executable)
-
-    lib_path = os.path.join(application_path, 'lib')
-    torch_lib_path = os.path.join(application_path, 'lib', 'torch', 'lib')
-    os.environ['PATH'] = lib_path + os.pathsep + torch_lib_path + os.pathsep + os.environ['PATH']
-else:
-    application_path = os.path.dirname(os.path.abspath(__file__))
-
-# Function to install the Russian-to-English model from a local file
-def install_ru_en_model():
-    models_dir = os.path.join(application_path, 'models')
-
-    # Ensure the models directory exists
-    if not os.path.exists(models_dir):
-        os.makedirs(models_dir)
-
-    # Path to the Russian-to-English model file
-    model_file = os.path.join(models_dir, 'translate-ru_en.argosmodel')
-
-    if os.path.exists(model_file):
-        # Install the model from the local file
-        argostranslate.package.install_from_path(model_file)
-        print("Russian-to-English model installed from local file.")
-    else:
-        print("Error: Russian-to-English model file not found.")
-        sys.exit(1)  # Exit the program if the model file is not found
+# Set up logging. Records are written by a background thread, so logging never holds up the audio path.
+log_listener = metrics.setup_queue_logging('LiveTranslator.log', level=logging.DEBUG, filemode='w')
+logging.debug("Starting application...")
 
+# Metrics: a JSON line with every counter and timing goes to the log each METRICS_LOG_INTERVAL seconds.
+# Set METRICS_PORT (e.g. 9464) to also serve them at http://127.0.0.1:<port>/metrics for Prometheus.
+METRICS_LOG_INTERVAL = 60
+METRICS_PORT = None
+metrics_reporter = metrics.JsonLinesReporter(logging.getLogger('metrics').info, interval=METRICS_LOG_INTERVAL).start()
+metrics_server = metrics.MetricsServer(METRICS_PORT).start() if METRICS_PORT else None
+
+# Set to a port (e.g. 8765) to push captions to browsers and OBS overlays at http://127.0.0.1:<port>/
+BROADCAST_PORT = None
+broadcaster = CaptionBroadcaster(BROADCAST_PORT).start() if BROADCAST_PORT else None
+
+# Set to a .jsonl, .srt or .vtt file name to keep a timestamped transcript of every session.
+# Results are written every TRANSCRIPT_FLUSH_INTERVAL seconds, a new file is started after TRANSCRIPT_ROTATE_HOURS.
+TRANSCRIPT_PATH = None
+TRANSCRIPT_FLUSH_INTERVAL = 5
+TRANSCRIPT_ROTATE_HOURS = 24
+transcript = TranscriptWriter(TRANSCRIPT_PATH, flush_interval=TRANSCRIPT_FLUSH_INTERVAL,
+                              rotate_seconds=TRANSCRIPT_ROTATE_HOURS * 3600) if TRANSCRIPT_PATH else None
+
+# Languages the captions are translated into, e.g. ['en', 'uk', 'pl']. Speech is recognized once
+# however many there are; live (partial) results are only shown in the first one.
+TARGET_LANGUAGES = ['en']
 
-# Install the translation model at launch
-install_ru_en_model()
+# Global variables
+translator_engine = None
 
 # Path to the icon file
-icon_path = os.path.join(application_path, "Logo.ico")
-
-# Initialize Vosk model for speech recognition
-model_path = os.path.join(application_path, "model")
-model = Model(model_path)
-
-# Grabs the audio from the url
-def get_audio_stream(youtube_url):
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'quiet': True,
-        'no_warnings': True,
-        'force_generic_extractor': True,
-    }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(youtube_url, download=False)
-        formats = info_dict.get('formats', None)
-        for f in formats:
-            if f.get('acodec') != 'none':  # Ensuring it's an audio format
-                return f['url']
-
-# Function to translate text
-def translate_text(text, target_language='en'):
-    if not text.strip():
-        return None  # Skip translation if there's no text
-
-    try:
-        # Perform translation using Argos Translate
-        translated_text = argostranslate.translate.translate(text, 'ru', target_language)
-        return translated_text
-    except Exception as e:
-        logging.error(f"Translation Error: {e}")
-        return f"Translation Error: {e}"
-
-# Function that uses speach recognition to turn audio to text
-def stream_audio_to_text(youtube_url, gui_text_widget, status_label, language_code):
-    global stop_translation_flag, ffmpeg_process
-    stop_translation_flag = False  # Reset stop flag
-    retry_count = 0
-    max_retries = 5
-
-    # Calls upon the function to get the audio
-    def start_ffmpeg_process():
-        global ffmpeg_process
-        stream_url = get_audio_stream(youtube_url)
-        print(f"Stream URL: {stream_url}")
-
-        # post processesing on audio, so it can be better recognized.
-        ffmpeg_command = [
-            'ffmpeg',
-            '-i', stream_url,
-            '-af', 'volume=1.5,acompressor,aresample=16000',
-            '-f', 'wav',
-            '-acodec', 'pcm_s16le',
-            '-ar', '16000',
-            '-ac', '1',
-            'pipe:1'
-        ]
-        print(f"Running ffmpeg command: {' '.join(ffmpeg_command)}")
-        ffmpeg_process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        # Print any ffmpeg errors
-        def log_ffmpeg_errors():
-            while True:
-                error = ffmpeg_process.stderr.readline().decode()
-                if "error" in error.lower():  # Only log actual errors
-                    print(f"ffmpeg error: {error.strip()}")
-                if "I/O error" in error:  # Specific check for I/O error
-                    print("ffmpeg encountered an I/O error. Restarting...")
-                    restart_ffmpeg_process()
-                if not error and ffmpeg_process.poll() is not None:
-                    break
-
-        threading.Thread(target=log_ffmpeg_errors, daemon=True).start()
-
- # Error handling to regrab a dropped connection
-    def restart_ffmpeg_process():
-        nonlocal retry_count
-        if retry_count < max_retries:
-            retry_count += 1
-            print(f"Attempting to restart ffmpeg process. Retry {retry_count}/{max_retries}")
-            status_label.config(text=f"Status: Error occurred, retrying {retry_count}/{max_retries}...")
-            start_ffmpeg_process()
-        else:
-            print("Max retries reached. Stopping translation.")
-            status_label.config(text="Status: Error - Translation stopped after max retries.")
-            stop_translation()
-
-    def update_status_translating():
-        status_label.config(text="Status: Translating...")
-
-    start_ffmpeg_process()
-
-    recognizer = KaldiRecognizer(model, 16000)
-    recognizer.SetWords(True)
-
-    last_activity_time = time.time()  # Track last time something was recognized
-
-    while True:
-        if stop_translation_flag:
-            print("Terminating ffmpeg process...")
-            ffmpeg_process.terminate()  # Terminate ffmpeg process
-            break
-
-        data = ffmpeg_process.stdout.read(4096)
-        if recognizer.AcceptWaveform(data):
-            update_status_translating()  # Update status to show translation is ongoing
-            result = recognizer.Result()
-        else:
-            result = recognizer.PartialResult()  # Handle partial results
-
-        result_dict = json.loads(result)
-        recognized_text = result_dict.get('text', '')
-
-        if recognized_text:
-            last_activity_time = time.time()  # Reset inactivity timer
-
-            translated_text = translate_text(recognized_text.strip(), target_language='en')
-
-            # Display real-time translation in the GUI if translation is successful
-            if translated_text:
-                gui_text_widget.config(state=tk.NORMAL)
-                gui_text_widget.insert(tk.END, f"Recognized: {recognized_text}\n")
-                gui_text_widget.insert(tk.END, f"Translated: {translated_text}\n\n")
-                gui_text_widget.config(state=tk.DISABLED)
-                gui_text_widget.yview(tk.END)
-        else:
-            current_time = time.time()
-            if current_time - last_activity_time > 300:  # 5 minutes of inactivity
-                gui_text_widget.config(state=tk.NORMAL)
-                gui_text_widget.insert(tk.END, "No speech detected for 5 minutes...\n")
-                gui_text_widget.config(state=tk.DISABLED)
-                gui_text_widget.yview(tk.END)
-                last_activity_time = current_time
+icon_path = os.path.join(engine.application_path, "Logo.ico")
+
+# Shows model loading progress; the models themselves load on a background thread
+def show_loading_progress(done, total, step):
+    if step is not None:
+        renderer.set_status(f"Status: Loading models ({done + 1}/{total}: {step.replace('_', ' ')})...")
+    elif model_loader.error is not None:
+        renderer.set_status(f"Status: Error - could not load models: {model_loader.error}")
+    elif translator_engine is None:
+        renderer.set_status(f"Status: Ready (started in {startup_timer.total():.1f}s)")
+
+# Transcript redraws per second and lines kept in the text box
+RENDER_MAX_FPS = 10
+RENDER_MAX_LINES = 2000
+
+# Shows engine events in the text box and status label.
+# Runs on engine threads, so it only queues the update; the renderer draws it from the Tk loop.
+# The utterance in progress is kept on a single "live" line that is rewritten in place.
+def display_event(event):
+    if event['type'] == 'status':
+        renderer.set_status(f"Status: {event['text']}")
+    elif event['type'] == 'notice':
+        renderer.append(f"{event['text']}\n")
+    elif event['type'] == 'partial':
+        live_text = f"Recognizing: {event['recognized']}\n"
+        if event['translated']:
+            live_text += f"Translating: {event['translated']}\n"
+        renderer.set_live(live_text)
+    elif event['recognized'] and len(event.get('translations', {})) > 1:
+        translated = ''.join(f"Translated ({language}): {text}\n" for language, text in event['translations'].items())
+        renderer.append(f"Recognized: {event['recognized']}\n{translated}\n")
+    elif event['recognized']:
+        renderer.append(f"Recognized: {event['recognized']}\nTranslated: {event['translated']}\n\n")
+    else:
+        renderer.set_live('')
 
 # Function to begin translation when start_translation button is pressed
 def start_translation():
+    global translator_engine
     youtube_url = url_entry.get()
     language_code = language_var.get()
-    status_label.config(text="Status: Translating...")
-    translation_thread = threading.Thread(target=stream_audio_to_text,
-                                          args=(youtube_url, output_text, status_label, language_code))
-    translation_thread.start()
+    renderer.set_status("Status: Translating...")
+    if translator_engine:
+        translator_engine.stop()
+    translator_engine = engine.LiveTranslatorEngine(youtube_url, language_code, target_language=TARGET_LANGUAGES,
+                                                    on_event=display_event)
+    if broadcaster:
+        translator_engine.add_listener(broadcaster.publish)
+    if transcript:
+        translator_engine.add_listener(transcript.write)
+    translator_engine.start()
 
 # Function to stop translation when start_translation button is pressed
 def stop_translation():
-    global stop_translation_flag, ffmpeg_process
-    stop_translation_flag = True
-    status_label.config(text="Status: Stopped.")
-    if ffmpeg_process:
-        print("Stopping ffmpeg process...")
-        ffmpeg_process.terminate()
-        ffmpeg_process = None
+    global translator_engine
+    renderer.set_status("Status: Stopped.")
+    if translator_engine:
+        translator_engine.stop()
+        translator_engine = None
 
 # Function to setup minimalist mode gui
 def toggle_minimalist_mode():
@@ -258,11 +154,20 @@ def toggle_minimalist_mode():
 
 # Close the application
 def close_application():
-    global stop_translation_flag, ffmpeg_process
-    stop_translation_flag = True
-    if ffmpeg_process:
+    if translator_engine:
         print("Closing application and stopping ffmpeg process...")
-        ffmpeg_process.terminate()
+        translator_engine.stop()
+    logging.info(f"Translation cache: {engine.translation_cache.stats()}")
+    engine.translation_cache.close()
+    renderer.stop()
+    metrics_reporter.stop()
+    if metrics_server:
+        metrics_server.stop()
+    if broadcaster:
+        broadcaster.stop()
+    if transcript:
+        transcript.close()
+    log_listener.stop()
     root.destroy()
 
 # Setup the GUI
@@ -299,10 +204,12 @@ url_entry.pack(side=tk.LEFT, padx=10)
 language_label = ttk.Label(top_frame, text="Language:")
 language_label.pack(side=tk.LEFT, padx=5)
 
+# Russian, plus every language with a Vosk model in models/vosk-<language>
 language_var = tk.StringVar()
 language_dropdown = ttk.Combobox(top_frame, textvariable=language_var, values=[
     'ru-RU',  # Russian
-], state="readonly")
+] + [language for language in engine.model_registry.available_languages() if language != engine.DEFAULT_LANGUAGE],
+    state="readonly")
 language_dropdown.set('ru-RU')  # Default to Russian
 language_dropdown.pack(side=tk.LEFT, padx=10)
 
@@ -327,4 +234,16 @@ status_label.pack(pady=10)
 minimalist_button = ttk.Button(root, text="Minimalist Mode", command=toggle_minimalist_mode)
 minimalist_button.pack(pady=5)
 
+# Draws queued transcript updates from the Tk loop
+renderer = TranscriptRenderer(root, output_text, status_label, max_fps=RENDER_MAX_FPS, max_lines=RENDER_MAX_LINES)
+renderer.start()
+
+startup_timer.mark('window')
+
+# Install the translation models and load the Vosk model of the default language without holding up the window.
+# Translation can be started right away, the engine waits for the models if they are not ready yet.
+model_loader = BackgroundLoader(engine.model_loading_steps(language_var.get(), TARGET_LANGUAGES), timer=startup_timer,
+                                on_progress=show_loading_progress)
+model_loader.start()
+
 root.mainloop()
@@ -0,0 +1,123 @@
+import time
+import queue
+import threading
+import logging
+import concurrent.futures
+
+
+# One caller waiting for its texts to be translated
+class _BatchRequest:
+    def __init__(self, texts, source, target):
+        self.texts = texts
+        self.source = source
+        self.target = target
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+# Groups translation requests from any number of threads into batched translate_batch(texts, source, target)
+# calls. Requests that pile up while a batch is running go out together in the next one (up to
+# max_batch_size texts); with max_wait > 0 a backlogged batch also waits that long for more texts.
+# A request that arrives while the batcher is idle is translated straight away.
+# A batch that mixes language pairs (e.g. one sentence fanned out to several targets) runs up to
+# parallel_pairs of them at the same time, each pair has its own Argos model.
+class TranslationBatcher:
+    def __init__(self, translate_batch, max_batch_size=16, max_wait=0.0, parallel_pairs=1):
+        self.translate_batch = translate_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.executor = None
+        if parallel_pairs > 1:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=parallel_pairs,
+                                                                  thread_name_prefix='translation-pair')
+        self.requests = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='translation-batcher', daemon=True)
+                self.thread.start()
+
+    # Translate several texts from one caller, blocks until they are done
+    def translate_many(self, texts, source, target):
+        if not texts:
+            return []
+        self._ensure_started()
+        request = _BatchRequest(list(texts), source, target)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def translate(self, text, source, target):
+        return self.translate_many([text], source, target)[0]
+
+    def _collect(self, first):
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                if self.requests.qsize() or self.max_wait <= 0 or len(batch) == 1:
+                    request = self.requests.get_nowait()
+                else:
+                    request = self.requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect(self.requests.get())
+
+            # One translate_batch call per language pair in the batch
+            groups = {}
+            for request in batch:
+                groups.setdefault((request.source, request.target), []).append(request)
+
+            if self.executor is not None and len(groups) > 1:
+                list(self.executor.map(lambda group: self._translate_group(*group), groups.items()))
+            else:
+                for pair, requests in groups.items():
+                    self._translate_group(pair, requests)
+
+    def _translate_group(self, pair, requests):
+        source, target = pair
+        texts = [text for request in requests for text in request.texts]
+        try:
+            results = self.translate_batch(texts, source, target)
+            error = None
+        except Exception as e:
+            logging.error(f"Batched translation failed: {e}")
+            results, error = None, e
+
+        with self.lock:
+            self.batches += 1
+            self.texts += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+
+        offset = 0
+        for request in requests:
+            if error is None:
+                request.results = results[offset:offset + len(request.texts)]
+            request.error = error
+            offset += len(request.texts)
+            request.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'texts': self.texts,
+                'average_batch': round(self.texts / self.batches, 2) if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+            }
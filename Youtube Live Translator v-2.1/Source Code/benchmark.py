@@ -0,0 +1,314 @@
+import os
+import sys
+import json
+import time
+import bisect
+import argparse
+import platform
+import subprocess
+import threading
+import logging
+import numpy as np
+import engine
+from vad import SpeechSegmenter
+from pcm_reader import open_pcm
+from batching import TranslationBatcher
+from translation_cache import TranslationCache
+
+BYTES_PER_SECOND = 16000 * 2  # 16 kHz, 16-bit mono, what the engine's ffmpeg produces
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+# Stands in for ffmpeg's stdout. With realtime=True audio is handed out no faster than it would
+# arrive from a live stream, otherwise as fast as it is read. Remembers when every byte went out,
+# so a result can be traced back to the moment its audio arrived.
+class PacedReader:
+    def __init__(self, stream, realtime=False):
+        self.stream = stream
+        self.realtime = realtime
+        self.started = None
+        self.delivered = 0
+        self.offsets = []
+        self.times = []
+        self.closed = False
+
+    def readinto(self, buffer):
+        if self.closed:
+            return 0
+        if self.started is None:
+            self.started = time.time()
+        if self.realtime:
+            delay = self.started + (self.delivered + len(buffer)) / BYTES_PER_SECOND - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        count = self.stream.readinto(buffer)
+        if not count:
+            return 0
+        self.delivered += count
+        self.offsets.append(self.delivered)
+        self.times.append(time.time())
+        return count
+
+    # Wall clock time at which the audio up to stream position `seconds` had been handed out
+    def delivered_at(self, seconds):
+        if not self.times:
+            return None
+        index = bisect.bisect_left(self.offsets, int(seconds * BYTES_PER_SECOND))
+        return self.times[min(index, len(self.times) - 1)]
+
+    def close(self):
+        self.closed = True
+        self.stream.close()
+
+
+# The process object the capture supervisor expects, playing back a local file instead of running ffmpeg
+class ReplayProcess:
+    def __init__(self, path, realtime=False):
+        stream, self.decoder = open_pcm(path)
+        self.stdout = PacedReader(stream, realtime)
+        self.stderr = None
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+        if self.decoder is not None and self.decoder.poll() is None:
+            self.decoder.terminate()
+
+    kill = terminate
+
+    def wait(self, timeout=None):
+        if self.decoder is not None:
+            self.decoder.wait(timeout)
+        return self.returncode
+
+
+# Stands in for Vosk's KaldiRecognizer: utterances are cut by the energy VAD and every second of
+# speech becomes a few placeholder words, so the rest of the pipeline gets a realistic flow of results.
+class StubRecognizer:
+    WORDS_PER_SECOND = 2.5
+
+    def __init__(self, sample_rate=16000):
+        self.segmenter = SpeechSegmenter(sample_rate=sample_rate)
+        self.finished = []
+
+    def SetWords(self, enabled):
+        pass
+
+    def _words(self, seconds):
+        return ' '.join(f"слово{index + 1}" for index in range(max(1, int(seconds * self.WORDS_PER_SECOND))))
+
+    def AcceptWaveform(self, data):
+        segments = self.segmenter.feed(data)
+        self.finished.extend(segments)
+        return bool(segments)
+
+    def Result(self):
+        text = ' '.join(self._words(segment.end - segment.start) for segment in self.finished)
+        self.finished = []
+        return json.dumps({'text': text})
+
+    def PartialResult(self):
+        seconds = self.segmenter.segment_frames * self.segmenter.frame_seconds
+        return json.dumps({'partial': self._words(seconds) if seconds else ''})
+
+    def FinalResult(self):
+        self.finished.extend(self.segmenter.flush())
+        return self.Result()
+
+
+def stub_translate_batch(texts, from_code, to_code):
+    return [f"[{to_code}] {text}" for text in texts]
+
+
+# The engine with its capture and, optionally, its models swapped for the replay and the stubs.
+# The replay is played once: the supervisor is given no retries, so the end of the file ends the run.
+class ReplayEngine(engine.LiveTranslatorEngine):
+    def __init__(self, replay, stub=False, **kwargs):
+        super().__init__('replay', max_retries=0, **kwargs)
+        self.replay = replay
+        self.stub = stub
+
+    def _start_ffmpeg_process(self, refresh=False):
+        return self.replay
+
+    def _load_models(self):
+        return True if self.stub else super()._load_models()
+
+    def _create_recognizer(self, model=None):
+        return StubRecognizer() if self.stub else super()._create_recognizer(model)
+
+
+def summarize_latencies(latencies):
+    if not latencies:
+        return {'count': 0}
+    values = np.array(latencies)
+    summary = {'count': len(latencies), 'mean': round(float(values.mean()), 4), 'max': round(float(values.max()), 4)}
+    for percentile in LATENCY_PERCENTILES:
+        summary[f'p{percentile}'] = round(float(np.percentile(values, percentile)), 4)
+    return summary
+
+
+# Highest resident memory of this process so far in MB, None where the platform cannot tell
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)  # macOS reports bytes
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=engine.application_path,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# Replays one file through the engine and returns the measurements as a dict
+def run_benchmark(path, realtime=False, stub=False, language='ru-RU', target='en'):
+    # A fresh in-memory cache, so earlier runs neither speed this one up nor get polluted by it
+    engine.translation_cache = TranslationCache(max_entries=engine.TRANSLATION_CACHE_SIZE, db_path=None)
+    model = None
+    model_load_seconds = 0.0
+    if stub:
+        engine.translation_batcher = TranslationBatcher(stub_translate_batch,
+                                                        max_batch_size=engine.TRANSLATION_BATCH_SIZE,
+                                                        max_wait=engine.TRANSLATION_BATCH_WAIT)
+        model = 'stub'
+    else:
+        started = time.perf_counter()
+        source_language = engine.base_language(language)
+        engine.ensure_translation_model(source_language, target)
+        model = engine.model_registry.get(source_language)
+        model_load_seconds = time.perf_counter() - started
+
+    replay = ReplayProcess(path, realtime=realtime)
+    events = []
+    events_lock = threading.Lock()
+
+    def collect(event):
+        with events_lock:
+            events.append(event)
+
+    # Unpaced, the whole file is a backlog by design, so only shed load when replaying at live speed
+    replay_engine = ReplayEngine(replay, stub=stub, language_code=language, target_language=target,
+                                 model=model, on_event=collect, load_shedding=None if realtime else ())
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    replay_engine.start()
+    replay_engine.join()
+    wall_seconds = time.perf_counter() - started
+    cpu_seconds = time.process_time() - cpu_started
+
+    audio_seconds = replay.stdout.delivered / BYTES_PER_SECOND
+    latencies = {'final': [], 'partial': []}
+    for event in events:
+        if event['type'] in latencies and 'end' in event:
+            delivered = replay.stdout.delivered_at(event['end'])
+            if delivered is not None:
+                latencies[event['type']].append(event['time'] - delivered)
+
+    stages = replay_engine.pipeline.stats() if replay_engine.pipeline else {}
+    source = replay_engine.pipeline.source_stats() if replay_engine.pipeline else {}
+    return {
+        'benchmark': 'replay',
+        'version': git_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'audio': os.path.basename(path), 'realtime': realtime, 'stub': stub,
+                     'language': language, 'target': target},
+        'audio_seconds': round(audio_seconds, 3),
+        'wall_seconds': round(wall_seconds, 3),
+        'real_time_factor': round(wall_seconds / audio_seconds, 4) if audio_seconds else None,
+        'cpu_seconds': round(cpu_seconds, 3),
+        'cpu_real_time_factor': round(cpu_seconds / audio_seconds, 4) if audio_seconds else None,
+        'model_load_seconds': round(model_load_seconds, 3),
+        'results': {kind: sum(1 for event in events if event['type'] == kind) for kind in ('final', 'partial')},
+        'latency_seconds': {kind: summarize_latencies(values) for kind, values in latencies.items()},
+        'stage_cpu_seconds': dict([(source.get('name', 'capture'), source.get('cpu_seconds'))] +
+                                  [(name, stage['cpu_seconds']) for name, stage in stages.items()]),
+        'stages': stages,
+        'translation': {'cache': engine.translation_cache.stats(), 'batches': engine.translation_batcher.stats()},
+        'load_shedding': replay_engine.shedder.stats() if replay_engine.shedder else {},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+# Headline numbers of a run next to a baseline run, as printable lines
+def compare(results, baseline):
+    def lookup(data, key):
+        for part in key.split('.'):
+            data = data.get(part) if isinstance(data, dict) else None
+        return data
+
+    lines = [f"{'metric':32} {'baseline':>10} {'now':>10} {'change':>8}"]
+    for key in ('real_time_factor', 'cpu_real_time_factor', 'latency_seconds.final.p50',
+                'latency_seconds.final.p95', 'latency_seconds.partial.p50', 'peak_rss_mb'):
+        old, new = lookup(baseline, key), lookup(results, key)
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ''
+        lines.append(f"{key:32} {str(old):>10} {str(new):>10} {change:>8}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a local audio file through the translation pipeline "
+                                                 "and measure how fast it keeps up.")
+    parser.add_argument('audio', help="Audio file to replay (16 kHz mono WAV or .pcm is read directly, "
+                                      "anything else is decoded with ffmpeg)")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Feed audio at the rate it would arrive live (default: as fast as possible)")
+    parser.add_argument('--stub', action='store_true',
+                        help="Use a stub recognizer and translator instead of Vosk and Argos")
+    parser.add_argument('--language', default='ru-RU', help="Spoken language of the audio (default: ru-RU)")
+    parser.add_argument('--target', default='en', help="Language to translate into (default: en)")
+    parser.add_argument('--model', default=None, help="Path to the Vosk model directory")
+    parser.add_argument('--output', default=None, help="Write the results as JSON to this file (default: stdout)")
+    parser.add_argument('--baseline', default=None, help="Earlier results file to compare against")
+    parser.add_argument('--log', default=None, help="Write the debug log to this file")
+    args = parser.parse_args(argv)
+
+    if args.log:
+        logging.basicConfig(filename=args.log, filemode='w', level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.WARNING)
+    if args.model:
+        engine.model_registry.register(args.language, vosk_path=args.model)
+
+    try:
+        results = run_benchmark(args.audio, realtime=args.realtime, stub=args.stub,
+                                language=args.language, target=args.target)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    final_latency = results['latency_seconds']['final']
+    print(f"{results['audio_seconds']}s of audio in {results['wall_seconds']}s "
+          f"(RTF {results['real_time_factor']}, CPU RTF {results['cpu_real_time_factor']}), "
+          f"final latency p50 {final_latency.get('p50')}s p95 {final_latency.get('p95')}s, "
+          f"peak RSS {results['peak_rss_mb']} MB", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print('\n'.join(compare(results, baseline)), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import json
+import time
+import base64
+import select
+import struct
+import hashlib
+import threading
+import logging
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import metrics
+
+# Event types that are sent to viewers; status updates only matter to the local window
+BROADCAST_TYPES = ('partial', 'final', 'notice')
+KEEPALIVE_INTERVAL = 15  # Seconds of silence before a keepalive is sent, so proxies keep the connection open
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+broadcast_clients = metrics.gauge('translator_broadcast_clients', "Connected caption viewers")
+broadcast_dropped = metrics.counter('translator_broadcast_dropped_total', "Events dropped for viewers that fell behind")
+
+# Minimal caption page, usable as an OBS browser source (the background is transparent)
+OVERLAY_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Live captions</title>
+<style>
+body { background: transparent; margin: 0; font: 32px sans-serif; color: white; text-shadow: 0 0 6px black; }
+#captions { position: fixed; bottom: 1em; left: 1em; right: 1em; }
+#live { opacity: 0.7; }
+</style></head>
+<body><div id="captions"><div id="final"></div><div id="live"></div></div>
+<script>
+var lang = new URLSearchParams(location.search).get('lang');
+var events = new EventSource('/events' + location.search);
+events.onmessage = function (message) {
+  var event = JSON.parse(message.data);
+  // Partials are only translated into the first target language
+  if (event.type === 'partial' && !lang) {
+    document.getElementById('live').textContent = event.translated || '';
+  } else if (event.type === 'final') {
+    var text = lang ? (event.translations || {})[lang] : event.translated;
+    if (text) {
+      document.getElementById('final').textContent = text;
+      document.getElementById('live').textContent = '';
+    }
+  }
+};
+</script></body></html>
+"""
+
+
+# One event, serialized once and framed once for every transport; all viewers share the same bytes
+class _Message:
+    def __init__(self, event):
+        self.type = event.get('type')
+        payload = json.dumps(event, ensure_ascii=False).encode('utf-8')
+        self.sse = b'data: ' + payload + b'\n\n'
+        self.websocket = _websocket_frame(0x1, payload)
+
+
+def _websocket_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+# Outgoing buffer of one viewer. When it is full the oldest partial is dropped first, since a newer
+# partial replaces it anyway, then the oldest event; a slow viewer only ever loses its own events.
+class _Client:
+    def __init__(self, max_buffer, include_partials=True, stream=None):
+        self.max_buffer = max_buffer
+        self.include_partials = include_partials
+        self.stream = stream
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def offer(self, message, stream=None):
+        if message.type == 'partial' and not self.include_partials:
+            return
+        if self.stream is not None and stream != self.stream:
+            return
+        with self.condition:
+            if len(self.queue) >= self.max_buffer:
+                oldest_partial = next((queued for queued in self.queue if queued.type == 'partial'), None)
+                if oldest_partial is not None:
+                    self.queue.remove(oldest_partial)
+                else:
+                    self.queue.popleft()
+                self.dropped += 1
+                broadcast_dropped.inc()
+            self.queue.append(message)
+            self.condition.notify()
+
+    # Next message, None after timeout seconds without one; raises EOFError once closed
+    def next(self, timeout):
+        with self.condition:
+            if not self.queue and not self.closed:
+                self.condition.wait(timeout)
+            if self.closed:
+                raise EOFError
+            return self.queue.popleft() if self.queue else None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+# Fans caption events out to any number of local viewers over Server-Sent Events (/events) and
+# WebSocket (/ws), and serves a ready-made overlay page at /. Every event is serialized once by
+# publish(); viewers only copy bytes, so translation work does not grow with the audience.
+# Late joiners first get the last history_size finished results and the current live line.
+# Query parameters: partials=0 leaves out partial results, stream=<id> follows one daemon stream.
+# The overlay page also takes lang=<code> to show one of several target languages.
+class CaptionBroadcaster:
+    def __init__(self, port=8765, host='127.0.0.1', history_size=50, client_buffer=100):
+        self.history = deque(maxlen=history_size)
+        self.live = {}  # Latest partial per stream, cleared by the final that replaces it
+        self.client_buffer = client_buffer
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.published = 0
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+        broadcast_clients.func = lambda: len(self.clients)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='caption-broadcast', daemon=True)
+        self.thread.start()
+        logging.info(f"Broadcasting captions on http://{self.server.server_address[0]}:{self.port}/")
+        return self
+
+    def stop(self):
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Send an event to every viewer; safe to call from any thread and never blocks on a viewer
+    def publish(self, event):
+        if event.get('type') not in BROADCAST_TYPES:
+            return
+        if 'time' not in event:
+            event = dict(event, time=time.time())
+        message = _Message(event)
+        stream = event.get('stream')
+        with self.lock:
+            self.published += 1
+            if message.type == 'partial':
+                self.live[stream] = (message, stream)
+            else:
+                self.live.pop(stream, None)
+                self.history.append((message, stream))
+            clients = list(self.clients)
+        for client in clients:
+            client.offer(message, stream)
+
+    def _subscribe(self, include_partials, stream):
+        client = _Client(self.client_buffer, include_partials, stream)
+        with self.lock:
+            # Replay under the lock so nothing published in between is missed or sent twice
+            for message, message_stream in list(self.history) + list(self.live.values()):
+                client.offer(message, message_stream)
+            self.clients.add(client)
+        return client
+
+    def _unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+        if client.dropped:
+            logging.info(f"Caption viewer left after {client.dropped} dropped events")
+
+    def stats(self):
+        with self.lock:
+            return {'clients': len(self.clients), 'published': self.published, 'history': len(self.history),
+                    'dropped': sum(client.dropped for client in self.clients)}
+
+    def _make_handler(self):
+        broadcaster = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            rbufsize = 0  # Unbuffered, so select() on the socket sees everything a WebSocket viewer sent
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                include_partials = query.get('partials', ['1'])[0] not in ('0', 'false', 'no')
+                stream = query.get('stream', [None])[0]
+                if url.path == '/events':
+                    self._serve_events(broadcaster._subscribe(include_partials, stream))
+                elif url.path == '/ws' and self.headers.get('Upgrade', '').lower() == 'websocket':
+                    self._serve_websocket(broadcaster._subscribe(include_partials, stream))
+                elif url.path == '/':
+                    body = OVERLAY_PAGE.encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_error(404)
+
+            def _serve_events(self, client):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    while True:
+                        message = client.next(KEEPALIVE_INTERVAL)
+                        self.wfile.write(message.sse if message is not None else b': keepalive\n\n')
+                        self.wfile.flush()
+                except (EOFError, OSError):
+                    pass
+                finally:
+                    broadcaster._unsubscribe(client)
+
+            def _serve_websocket(self, client):
+                key = self.headers.get('Sec-WebSocket-Key', '')
+                accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+                self.send_response(101)
+                self.send_header('Upgrade', 'websocket')
+                self.send_header('Connection', 'Upgrade')
+                self.send_header('Sec-WebSocket-Accept', accept)
+                self.end_headers()
+                self.close_connection = True
+                last_sent = time.monotonic()
+                try:
+                    # Short waits so a viewer closing the connection is noticed even when nothing is said
+                    while self._read_websocket_control():
+                        message = client.next(1.0)
+                        if message is not None:
+                            frame = message.websocket
+                        elif time.monotonic() - last_sent > KEEPALIVE_INTERVAL:
+                            frame = _websocket_frame(0x9, b'')  # Ping
+                        else:
+                            continue
+                        self.wfile.write(frame)
+                        self.wfile.flush()
+                        last_sent = time.monotonic()
+                except (EOFError, OSError):
+                    pass
+                finally:
+                    broadcaster._unsubscribe(client)
+
+            # Handle whatever the viewer sent without blocking; returns False once it closed the connection.
+            # Viewers only ever send control frames (close, ping, pong), text they send is ignored.
+            def _read_websocket_control(self):
+                while select.select([self.connection], [], [], 0)[0]:
+                    header = self.rfile.read(2)
+                    if len(header) < 2:
+                        return False
+                    opcode, length = header[0] & 0x0F, header[1] & 0x7F
+                    if length == 126:
+                        length = struct.unpack('!H', self.rfile.read(2))[0]
+                    elif length == 127:
+                        length = struct.unpack('!Q', self.rfile.read(8))[0]
+                    mask = self.rfile.read(4) if header[1] & 0x80 else b'\0\0\0\0'
+                    payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(self.rfile.read(length)))
+                    if opcode == 0x8:
+                        self.wfile.write(_websocket_frame(0x8, payload[:2]))
+                        return False
+                    if opcode == 0x9:
+                        self.wfile.write(_websocket_frame(0xA, payload))
+                return True
+
+            def log_message(self, format, *args):
+                logging.debug("Caption viewer %s: " + format, self.address_string(), *args)
+
+        return Handler
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import collections
+import multiprocessing
+import concurrent.futures
+import engine
+from fanout import FanoutTranslator, parse_targets
+from vad import SpeechSegmenter
+from pcm_reader import open_pcm
+from transcript_export import TranscriptWriter
+
+BYTES_PER_SECOND = 16000 * 2  # 16 kHz, 16-bit mono
+READ_SIZE = 64 * 1024
+RECOGNIZER_BLOCK = 8000  # Bytes fed to Vosk per AcceptWaveform call, a quarter of a second
+
+# Speech (silence is already cut out) sent to a worker per job. Each job is decoded from scratch by
+# its own recognizer, so jobs can run in any order; longer jobs mean fewer recognizer start-ups,
+# shorter ones spread a short recording over more cores.
+CATCHUP_CHUNK_SECONDS = 60
+# Silence long enough to split at; shorter pauses stay inside a segment so words are not cut
+CATCHUP_PAUSE_SECONDS = 0.5
+# Every segment ends an utterance, so segments are only cut at pauses. This is just the cap for speech
+# that never pauses; the live default of 15 seconds would split long sentences into separate results.
+CATCHUP_MAX_SEGMENT_SECONDS = 300
+
+# The Vosk model of this worker process, loaded once by _init_worker
+_worker_model = None
+
+
+def _init_worker(path):
+    global _worker_model
+    _worker_model = engine.load_model(path)
+
+
+# Shift a result from the recognizer's clock (seconds of audio it was fed) to the stream's
+def _shifted(item, offset):
+    item['end'] = round(item['end'] + offset, 3)
+    if 'start' in item:
+        item['start'] = round(item['start'] + offset, 3)
+    return item
+
+
+# Decode one job in a worker process: a list of (stream start seconds, PCM) speech segments.
+# The recognizer is only fed the speech, so its clock runs behind the stream by the silence cut
+# out before each segment; that offset is added back to every result.
+def transcribe_chunk(segments):
+    from vosk import KaldiRecognizer
+    recognizer = KaldiRecognizer(_worker_model, 16000)
+    recognizer.SetWords(True)
+    results = []
+    fed_seconds = 0.0
+    for start, audio in segments:
+        offset = start - fed_seconds
+        for position in range(0, len(audio), RECOGNIZER_BLOCK):
+            block = audio[position:position + RECOGNIZER_BLOCK]
+            if recognizer.AcceptWaveform(block):
+                results.append(_shifted(engine.final_item(json.loads(recognizer.Result()), fed_seconds), offset))
+        fed_seconds += len(audio) / BYTES_PER_SECOND
+        # Every segment ends an utterance, so no result spans the silence between two segments
+        results.append(_shifted(engine.final_item(json.loads(recognizer.FinalResult()), fed_seconds), offset))
+    return [item for item in results if item['recognized']]
+
+
+# Transcribes (and translates) a local audio file or a recorded stream as fast as the cores allow.
+# The audio is decoded by ffmpeg and cut at silences by the VAD, the speech is grouped into jobs
+# of about chunk_seconds and the jobs are decoded by a pool of worker processes, each with its own
+# Vosk model. Results are handed to on_event in stream order, as the engine's final events, with
+# 'start' and 'end' in seconds from the beginning of the recording. Several target languages
+# ('en,uk,pl') are filled in as the engine does, in 'translations', with 'translated' the first one.
+# At most two jobs per worker are read ahead, so memory does not grow with the length of the recording.
+def run_catchup(source, on_event, workers=None, language_code='ru-RU', target_language='en', translate=True,
+                chunk_seconds=CATCHUP_CHUNK_SECONDS, model=None):
+    workers = workers or os.cpu_count() or 1
+    source_language = engine.base_language(language_code)
+    targets = parse_targets(target_language)
+    if translate:
+        for target in targets:
+            engine.ensure_translation_model(source_language, target)
+    fanout = FanoutTranslator(engine.fanout_translate_texts, targets, engine.has_direct_translation)
+    # A YouTube page is resolved to its audio URL, anything else is handed to ffmpeg as it is
+    media = source if os.path.exists(source) or '://' not in source else engine.get_audio_stream(source)
+    stream, decoder = open_pcm(media)
+    segmenter = SpeechSegmenter(pause=CATCHUP_PAUSE_SECONDS, max_segment=CATCHUP_MAX_SEGMENT_SECONDS)
+    stats = {'workers': workers, 'audio_seconds': 0.0, 'speech_seconds': 0.0, 'jobs': 0, 'results': 0}
+    started = time.time()
+
+    def deliver(future):
+        results = future.result()
+        if translate and results:
+            translations = fanout.translate_many([item['recognized'] for item in results], source_language)
+        else:
+            translations = {target: [''] * len(results) for target in targets}
+        for index, item in enumerate(results):
+            item['translations'] = {target: translations[target][index] or '' for target in targets}
+            item['translated'] = item['translations'][targets[0]]
+            item['time'] = time.time()
+            on_event(item)
+        stats['results'] += len(results)
+
+    model = model or engine.model_registry.vosk_path(source_language)
+    executor = concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model,))
+    in_flight = collections.deque()
+    job, job_seconds = [], 0.0
+
+    def submit():
+        nonlocal job, job_seconds
+        in_flight.append(executor.submit(transcribe_chunk, job))
+        stats['jobs'] += 1
+        job, job_seconds = [], 0.0
+        while len(in_flight) > workers * 2:
+            deliver(in_flight.popleft())
+
+    try:
+        while True:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            stats['audio_seconds'] += len(data) / BYTES_PER_SECOND
+            for segment in segmenter.feed(data):
+                job.append((segment.start, segment.audio))
+                job_seconds += segment.end - segment.start
+                stats['speech_seconds'] += segment.end - segment.start
+                if job_seconds >= chunk_seconds:
+                    submit()
+        for segment in segmenter.flush():
+            job.append((segment.start, segment.audio))
+            stats['speech_seconds'] += segment.end - segment.start
+        if job:
+            submit()
+        while in_flight:
+            deliver(in_flight.popleft())
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=True)
+        fanout.close()
+        stream.close()
+        if decoder is not None:
+            decoder.terminate()
+            decoder.wait()
+
+    stats['wall_seconds'] = round(time.time() - started, 3)
+    stats['speed'] = round(stats['audio_seconds'] / stats['wall_seconds'], 2) if stats['wall_seconds'] else None
+    stats['audio_seconds'] = round(stats['audio_seconds'], 3)
+    stats['speech_seconds'] = round(stats['speech_seconds'], 3)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe and translate a recording or a finished stream "
+                                                 "with all CPU cores, much faster than real time.")
+    parser.add_argument('source', help="Audio or video file, or the URL of a recorded YouTube stream or video")
+    parser.add_argument('--language', default='ru-RU', help="Spoken language of the recording (default: ru-RU)")
+    parser.add_argument('--target', default='en',
+                        help="Language(s) to translate into, comma separated, e.g. en,uk,pl (default: en)")
+    parser.add_argument('--model', default=None, help="Path to the Vosk model directory of --language")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes, each with its own copy of the Vosk model (default: number of CPU cores)")
+    parser.add_argument('--chunk-seconds', type=float, default=CATCHUP_CHUNK_SECONDS,
+                        help=f"Seconds of speech per job (default: {CATCHUP_CHUNK_SECONDS})")
+    parser.add_argument('--no-translate', action='store_true', help="Only transcribe")
+    parser.add_argument('--output', default='-',
+                        help="Write the results to this .jsonl, .srt or .vtt file (default: JSON lines on stdout)")
+    parser.add_argument('--log', default=None, help="Write the debug log to this file")
+    args = parser.parse_args(argv)
+
+    if args.log:
+        logging.basicConfig(filename=args.log, filemode='w', level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.WARNING)
+    if args.model:
+        engine.model_registry.register(args.language, vosk_path=args.model)
+
+    transcript = None
+    if args.output == '-':
+        def write_event(event):
+            print(json.dumps(event, ensure_ascii=False), flush=True)
+    else:
+        transcript = TranscriptWriter(args.output)
+        write_event = transcript.write
+
+    try:
+        stats = run_catchup(args.source, write_event, workers=args.workers, language_code=args.language,
+                            target_language=args.target, translate=not args.no_translate, chunk_seconds=args.chunk_seconds)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 1
+    finally:
+        if transcript:
+            transcript.close()
+        engine.translation_cache.close()
+
+    print(f"{stats['audio_seconds']}s of audio ({stats['speech_seconds']}s of speech) in {stats['wall_seconds']}s "
+          f"with {stats['workers']} workers, {stats['speed']}x real time, {stats['results']} results",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,104 @@
+from startup import StartupTimer, BackgroundLoader
+startup_timer = StartupTimer()
+
+import sys
+import json
+import argparse
+import engine
+from cli_options import (add_service_options, add_transcript_options, shedding_policies, transcript_writer_options,
+                         Services)
+from fanout import parse_targets
+from transcript_export import TranscriptWriter
+
+startup_timer.mark('imports')
+
+
+# Formats an event as a plain text line
+def format_text(event):
+    if event['type'] in ('status', 'notice'):
+        return f"[{event['type']}] {event['text']}"
+    return f"[{event['type']}] {event['recognized']} => {event.get('translated', '')}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Translate a YouTube live stream without the GUI.")
+    parser.add_argument('url', help="YouTube live stream URL")
+    parser.add_argument('--language', default='ru-RU', help="Spoken language of the stream (default: ru-RU)")
+    parser.add_argument('--target', default='en',
+                        help="Language(s) to translate into, comma separated, e.g. en,uk,pl (default: en)")
+    parser.add_argument('--model', default=None, help="Path to the Vosk model directory of --language")
+    parser.add_argument('--output', default='-', help="File to append transcript events to (default: stdout)")
+    parser.add_argument('--format', choices=('jsonl', 'text'), default='jsonl', help="Output format")
+    parser.add_argument('--partials', action='store_true', help="Also write partial results")
+    parser.add_argument('--status', action='store_true', help="Also write status events")
+    parser.add_argument('--timings', action='store_true', help="Print a startup timing breakdown to stderr")
+    add_service_options(parser)
+    parser.add_argument('--transcript', default=None,
+                        help="Also keep a timestamped transcript of the final results in this .jsonl, .srt or .vtt file")
+    add_transcript_options(parser)
+    return parser.parse_args(argv)
+
+
+# Runs the engine headless and writes transcript events to stdout or a file
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        policies = shedding_policies(args)
+        targets = parse_targets(args.target)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    services = Services(args).start()
+
+    if args.model:
+        engine.model_registry.register(args.language, vosk_path=args.model)
+
+    # The engine starts resolving the stream straight away and waits for the models if it has to
+    def report_timings(done, total, step):
+        if step is None and args.timings:
+            print(f"Startup timings: {startup_timer.report()}", file=sys.stderr)
+
+    model_loader = BackgroundLoader(engine.model_loading_steps(args.language, targets), timer=startup_timer,
+                                    on_progress=report_timings)
+    model_loader.start()
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    translator_engine = engine.LiveTranslatorEngine(args.url, args.language, target_language=targets,
+                                                    load_shedding=policies, latency_budget=args.latency_budget)
+    if services.broadcaster:
+        translator_engine.add_listener(services.broadcaster.publish)
+    transcript = None
+    if args.transcript:
+        transcript = TranscriptWriter(args.transcript, args.transcript_format, **transcript_writer_options(args))
+        translator_engine.add_listener(transcript.write)
+    events = translator_engine.events()
+    translator_engine.start()
+    try:
+        for event in events:
+            if event['type'] == 'partial' and not args.partials:
+                continue
+            if event['type'] == 'status' and not args.status:
+                continue
+            if args.format == 'jsonl':
+                output.write(json.dumps(event, ensure_ascii=False) + '\n')
+            else:
+                output.write(format_text(event) + '\n')
+            output.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        translator_engine.stop()
+        if model_loader.error is not None:
+            print(f"Error: {model_loader.error}", file=sys.stderr)
+        translator_engine.join(timeout=5)
+        engine.translation_cache.close()
+        if transcript:
+            transcript.close()
+        if output is not sys.stdout:
+            output.close()
+        services.stop()
+    return 1 if model_loader.error is not None else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
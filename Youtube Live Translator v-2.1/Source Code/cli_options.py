@@ -0,0 +1,87 @@
+import logging
+import engine
+import metrics
+import load_shedding
+from broadcast import CaptionBroadcaster
+from transcript_export import TRANSCRIPT_FORMATS, writer_options
+
+
+# Options cli.py and daemon.py both take: the debug log, load shedding, the caption broadcast and metrics
+def add_service_options(parser):
+    parser.add_argument('--log', default=None, help="Write the debug log to this file")
+    parser.add_argument('--latency-budget', type=float, default=None,
+                        help=f"Seconds the captions may fall behind before load is shed (default: {engine.LATENCY_BUDGET_SECONDS})")
+    parser.add_argument('--shed', default=None,
+                        help="Comma separated load shedding policies, from "
+                             f"{', '.join(load_shedding.POLICIES)}, or 'none' "
+                             f"(default: {','.join(engine.LOAD_SHEDDING_POLICIES)})")
+    parser.add_argument('--broadcast-port', type=int, default=None,
+                        help="Push captions to browsers and OBS overlays at http://127.0.0.1:<port>/")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve metrics for Prometheus at http://127.0.0.1:<port>/metrics")
+    parser.add_argument('--metrics-json', default=None,
+                        help="Append a JSON line with all metrics to this file every --metrics-interval seconds")
+    parser.add_argument('--metrics-interval', type=float, default=10, help="Seconds between metrics lines (default: 10)")
+
+
+# Transcript format, flushing and rotation; each entry point adds its own option for where transcripts go
+def add_transcript_options(parser, default_format=None):
+    parser.add_argument('--transcript-format', choices=TRANSCRIPT_FORMATS, default=default_format,
+                        help=f"Transcript format (default: {default_format or 'from the file extension'})")
+    parser.add_argument('--transcript-flush', type=float, default=5,
+                        help="Seconds between transcript writes (default: 5)")
+    parser.add_argument('--rotate-mb', type=float, default=None, help="Start a new transcript file after this many MB")
+    parser.add_argument('--rotate-hours', type=float, default=None, help="Start a new transcript file after this many hours")
+
+
+# Load shedding policies from --shed, None for the engine's default; raises ValueError for an unknown policy
+def shedding_policies(args):
+    return load_shedding.parse_policies(args.shed) if args.shed is not None else None
+
+
+# TranscriptWriter / TranscriptRouter settings from the transcript options
+def transcript_writer_options(args):
+    return writer_options(args.transcript_flush, args.rotate_mb, args.rotate_hours)
+
+
+# The logging, metrics and broadcast set up from add_service_options' options.
+# start() sets them up, stop() shuts them down again, the log last so it sees everything else stop.
+class Services:
+    def __init__(self, args):
+        self.args = args
+        self.log_listener = None
+        self.metrics_server = None
+        self.metrics_file = None
+        self.metrics_reporter = None
+        self.broadcaster = None
+
+    def start(self):
+        args = self.args
+        if args.log:
+            # Written from a background thread so the audio path never waits for the log file
+            self.log_listener = metrics.setup_queue_logging(args.log, level=logging.DEBUG, filemode='w')
+        else:
+            logging.basicConfig(level=logging.WARNING)
+        if args.metrics_port:
+            self.metrics_server = metrics.MetricsServer(args.metrics_port).start()
+        if args.metrics_json:
+            self.metrics_file = open(args.metrics_json, 'a', encoding='utf-8')
+            self.metrics_reporter = metrics.JsonLinesReporter(self._write_metrics, interval=args.metrics_interval).start()
+        if args.broadcast_port:
+            self.broadcaster = CaptionBroadcaster(args.broadcast_port).start()
+        return self
+
+    def _write_metrics(self, line):
+        self.metrics_file.write(line + '\n')
+        self.metrics_file.flush()
+
+    def stop(self):
+        if self.metrics_reporter:
+            self.metrics_reporter.stop()
+            self.metrics_file.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.broadcaster:
+            self.broadcaster.stop()
+        if self.log_listener:
+            self.log_listener.stop()
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import argparse
+import threading
+import logging
+import engine
+from cli_options import (add_service_options, add_transcript_options, shedding_policies, transcript_writer_options,
+                         Services)
+from fanout import parse_targets
+from transcript_export import TranscriptRouter
+
+
+# Long running service that translates several live streams at once.
+# Every stream gets its own KaldiRecognizer and pipeline, but streams in the same language share one
+# loaded Vosk Model from engine.model_registry (or the model given here), and all of them share the
+# process wide translator/cache, so memory grows per stream and per language and not per model.
+# A shared semaphore keeps the number of Vosk decodes running at once at or below max_decoders.
+class TranslatorDaemon:
+    def __init__(self, model=None, max_decoders=None, target_language='en', on_event=None,
+                 load_shedding=None, latency_budget=None):
+        self.model = model
+        self.max_decoders = max_decoders or os.cpu_count() or 1
+        self.decode_slots = threading.BoundedSemaphore(self.max_decoders)
+        self.target_language = target_language
+        self.on_event = on_event
+        self.load_shedding = load_shedding
+        self.latency_budget = latency_budget
+        self.streams = {}
+        self.lock = threading.Lock()
+        self.next_id = 1
+
+    # Start translating another stream, returns its id
+    def add_stream(self, youtube_url, language_code='ru-RU', stream_id=None):
+        with self.lock:
+            if stream_id is None:
+                stream_id = str(self.next_id)
+                self.next_id += 1
+            if stream_id in self.streams:
+                raise ValueError(f"Stream {stream_id} already exists")
+            stream_engine = engine.LiveTranslatorEngine(
+                youtube_url, language_code, target_language=self.target_language, model=self.model,
+                on_event=self._handle_event, stream_id=stream_id, decode_slots=self.decode_slots,
+                load_shedding=self.load_shedding, latency_budget=self.latency_budget)
+            self.streams[stream_id] = stream_engine
+        stream_engine.start()
+        logging.info(f"Added stream {stream_id}: {youtube_url}")
+        return stream_id
+
+    # Stop a stream and forget about it
+    def remove_stream(self, stream_id, timeout=5):
+        with self.lock:
+            stream_engine = self.streams.pop(stream_id, None)
+        if stream_engine is None:
+            return False
+        stream_engine.stop()
+        stream_engine.join(timeout)
+        logging.info(f"Removed stream {stream_id}")
+        return True
+
+    def list_streams(self):
+        with self.lock:
+            return {
+                stream_id: {
+                    'url': stream_engine.youtube_url,
+                    'language': stream_engine.language_code,
+                    'running': stream_engine.is_running(),
+                    'queues': stream_engine.pipeline.depths() if stream_engine.pipeline else {},
+                    'capture': stream_engine.capture.stats() if stream_engine.capture else {},
+                    'load_shedding': stream_engine.shedder.stats() if stream_engine.shedder else {},
+                }
+                for stream_id, stream_engine in self.streams.items()
+            }
+
+    def stop(self):
+        for stream_id in list(self.streams):
+            self.remove_stream(stream_id)
+
+    def _handle_event(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+
+# Writes events as JSON lines, one lock so lines from different streams never interleave
+def make_jsonl_writer(output, include_partials=False):
+    lock = threading.Lock()
+
+    def write_event(event):
+        if event['type'] == 'partial' and not include_partials:
+            return
+        line = json.dumps(event, ensure_ascii=False)
+        with lock:
+            output.write(line + '\n')
+            output.flush()
+
+    return write_event
+
+
+# Reads control commands from stdin until EOF or "quit":
+#   add <url> [language]   remove <id>   list   quit
+def run_command_loop(daemon, commands=sys.stdin, replies=sys.stderr):
+    for line in commands:
+        parts = line.split()
+        if not parts:
+            continue
+        command, arguments = parts[0].lower(), parts[1:]
+        try:
+            if command == 'add' and arguments:
+                stream_id = daemon.add_stream(arguments[0], *arguments[1:2])
+                print(f"added {stream_id}", file=replies)
+            elif command == 'remove' and arguments:
+                removed = daemon.remove_stream(arguments[0])
+                print(f"removed {arguments[0]}" if removed else f"unknown stream {arguments[0]}", file=replies)
+            elif command == 'list':
+                print(json.dumps(daemon.list_streams(), ensure_ascii=False), file=replies)
+            elif command == 'quit':
+                return
+            else:
+                print(f"unknown command: {line.strip()}", file=replies)
+        except Exception as e:
+            print(f"error: {e}", file=replies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Translate several YouTube live streams with one shared model.")
+    parser.add_argument('urls', nargs='*', help="Stream URLs to start with")
+    parser.add_argument('--language', default='ru-RU', help="Spoken language of the streams (default: ru-RU)")
+    parser.add_argument('--target', default='en',
+                        help="Language(s) to translate into, comma separated, e.g. en,uk,pl (default: en)")
+    parser.add_argument('--model', default=None, help="Path to the Vosk model directory of --language")
+    parser.add_argument('--max-decoders', type=int, default=None,
+                        help="Most Vosk decodes to run at once (default: number of CPU cores)")
+    parser.add_argument('--partials', action='store_true', help="Also write partial results")
+    add_service_options(parser)
+    parser.add_argument('--transcript-dir', default=None,
+                        help="Also keep a timestamped transcript per stream in this directory, as stream-<id>.<format>")
+    add_transcript_options(parser, default_format='jsonl')
+    args = parser.parse_args(argv)
+    try:
+        policies = shedding_policies(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    services = Services(args).start()
+    if args.model:
+        engine.model_registry.register(args.language, vosk_path=args.model)
+    try:
+        for target in parse_targets(args.target):
+            engine.ensure_translation_model(engine.base_language(args.language), target)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        services.stop()
+        return 1
+
+    write_event = make_jsonl_writer(sys.stdout, include_partials=args.partials)
+    broadcaster = services.broadcaster
+    transcripts = None
+    if args.transcript_dir:
+        transcripts = TranscriptRouter(args.transcript_dir, args.transcript_format, **transcript_writer_options(args))
+
+    # Viewers pick a stream with ?stream=<id>, without it they see every stream
+    def handle_event(event):
+        write_event(event)
+        if broadcaster:
+            broadcaster.publish(event)
+        if transcripts:
+            transcripts.write(event)
+
+    daemon = TranslatorDaemon(max_decoders=args.max_decoders, target_language=args.target, on_event=handle_event,
+                              load_shedding=policies, latency_budget=args.latency_budget)
+    for url in args.urls:
+        daemon.add_stream(url, args.language)
+
+    print("Commands: add <url> [language] | remove <id> | list | quit", file=sys.stderr)
+    try:
+        run_command_loop(daemon)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        engine.translation_cache.close()
+        if transcripts:
+            transcripts.close()
+        services.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,777 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+import logging
+import hashlib
+import metrics
+import partials
+import pipeline
+from batching import TranslationBatcher
+from fanout import FanoutTranslator, parse_targets
+from supervisor import CaptureSupervisor
+from stream_resolver import StreamResolver
+from translation_cache import TranslationCache
+from model_registry import ModelRegistry, base_language
+from load_shedding import LoadShedder, FEED, DROP, SKIP_PARTIALS, SKIP_SILENCE, SMALLER_MODEL, DROP_OLDEST
+
+# Argos (which pulls in torch) and Vosk are imported where they are first used rather than here,
+# so a window or command line that imports this module comes up without waiting for them.
+
+# Get the path to the directory where the application is located
+if getattr(sys, 'frozen', False):
+    application_path = os.path.dirname(sys.executable)
+
+    lib_path = os.path.join(application_path, 'lib')
+    torch_lib_path = os.path.join(application_path, 'lib', 'torch', 'lib')
+    os.environ['PATH'] = lib_path + os.pathsep + torch_lib_path + os.pathsep + os.environ['PATH']
+else:
+    application_path = os.path.dirname(os.path.abspath(__file__))
+
+# Default location of the Vosk speech recognition model
+model_path = os.path.join(application_path, "model")
+
+# Spoken language of the bundled model, used when nothing else is asked for
+DEFAULT_LANGUAGE = 'ru'
+
+# Vosk models and Argos translations are loaded per language on first use. Idle ones are unloaded
+# again, least recently used first, once the loaded models take more than MODEL_MEMORY_BUDGET_MB
+# (None: never unload). Other languages go in models/vosk-<language> and models/translate-<from>_<to>.argosmodel.
+MODEL_MEMORY_BUDGET_MB = 4096
+
+# Queue size and backpressure policy in front of each pipeline stage.
+# 4096-byte audio chunks are 128 ms each, so 256 queued chunks is about 30 seconds of audio.
+# The translate stage takes up to batch_size queued results at a time so their translations go out together.
+PIPELINE_STAGES = {
+    'recognize': {'maxsize': 256, 'backpressure': pipeline.BLOCK},
+    'translate': {'maxsize': 64, 'backpressure': pipeline.BLOCK, 'batch_size': 16, 'batch_wait': 0.0},
+    'emit': {'maxsize': 64, 'backpressure': pipeline.BLOCK},
+}
+PIPELINE_REPORT_INTERVAL = 5  # Seconds between queue depth reports
+
+# ffmpeg output is read into a fixed ring of AUDIO_CHUNK_SIZE byte buffers, one per queued chunk
+# plus the one being read and the one Vosk is working on, so capture allocates nothing per chunk.
+AUDIO_CHUNK_SIZE = 4096
+
+# Reconnect backoff: the wait doubles after every failed attempt, from RECONNECT_BASE_DELAY up to
+# RECONNECT_MAX_DELAY seconds, and the engine gives up after max_retries failures in a row
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+# Load shedding: once more than LATENCY_BUDGET_SECONDS of audio is waiting to be recognized, the engine
+# applies LOAD_SHEDDING_POLICIES until it has caught up, so captions do not drift further and further
+# behind. drop_oldest only throws audio away when it is more than twice the budget behind.
+# smaller_model needs a small Vosk model in models/vosk-<language>-small.
+LATENCY_BUDGET_SECONDS = 5.0
+LOAD_SHEDDING_POLICIES = (SKIP_PARTIALS, SKIP_SILENCE, DROP_OLDEST)
+
+# Hot-path metrics, exposed through metrics.MetricsServer and metrics.JsonLinesReporter
+STAGE_SECONDS_HELP = "Seconds spent per call in each hot-path step"
+capture_read_seconds = metrics.histogram('translator_stage_seconds', STAGE_SECONDS_HELP, stage='capture_read')
+accept_waveform_seconds = metrics.histogram('translator_stage_seconds', STAGE_SECONDS_HELP, stage='accept_waveform')
+translate_seconds = metrics.histogram('translator_stage_seconds', STAGE_SECONDS_HELP, stage='translate_text')
+ingested_bytes = metrics.counter('translator_ingested_bytes_total', "PCM bytes read from ffmpeg")
+final_results = metrics.counter('translator_results_total', "Final results recognized")
+partial_results = metrics.counter('translator_partials_total', "Partial results recognized")
+translation_errors = metrics.counter('translator_errors_total', "Errors, by where they happened", kind='translation')
+
+# Translation memo cache. Repeated phrases skip Argos entirely and warm entries are kept
+# on disk between runs; set TRANSLATION_CACHE_DB to None to keep the cache in memory only.
+TRANSLATION_CACHE_SIZE = 4096
+TRANSLATION_CACHE_DB = os.path.join(application_path, 'translation_cache.sqlite3')
+translation_cache = TranslationCache(max_entries=TRANSLATION_CACHE_SIZE, db_path=TRANSLATION_CACHE_DB)
+
+# Sentences waiting to be translated (from one stream catching up, or from several streams at once)
+# are sent to Argos together, at most TRANSLATION_BATCH_SIZE at a time. A backlogged batch waits up to
+# TRANSLATION_BATCH_WAIT seconds for more sentences; an idle translator never waits.
+TRANSLATION_BATCH_SIZE = 16
+TRANSLATION_BATCH_WAIT = 0.0
+# Up to this many language pairs of one batch (e.g. ru->en, en->uk and en->pl for a stream captioned in
+# several languages) are translated at the same time
+TRANSLATION_PARALLEL_PAIRS = 3
+
+
+# Fingerprint of the model file; the sha256 is only computed when size or modification time changed
+def _model_file_fingerprint(model_file, known=None):
+    stat = os.stat(model_file)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    if known and known.get('size') == stat.st_size and known.get('mtime') == stat.st_mtime:
+        fingerprint['sha256'] = known.get('sha256')
+        return fingerprint
+    digest = hashlib.sha256()
+    with open(model_file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+# Function to install a translation model (Russian-to-English by default) from a local file.
+# Returns False without reinstalling when this exact file is already installed.
+def install_translation_package(from_code='ru', to_code='en'):
+    import argostranslate.package
+
+    models_dir = model_registry.models_dir
+
+    # Ensure the models directory exists
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    # Path to the model file
+    model_file = model_registry.argos_package_path(from_code, to_code)
+    stamp_file = model_file + '.installed'
+
+    if not os.path.exists(model_file):
+        raise FileNotFoundError(f"{from_code}-to-{to_code} translation model file not found: {model_file}")
+
+    # Skip the install when Argos already has the package and the file has not changed since
+    try:
+        with open(stamp_file, 'r', encoding='utf-8') as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        stamp = None
+    fingerprint = _model_file_fingerprint(model_file, stamp)
+    installed = any(pkg.from_code == from_code and pkg.to_code == to_code
+                    for pkg in argostranslate.package.get_installed_packages())
+    if installed and stamp and stamp.get('sha256') == fingerprint['sha256']:
+        if stamp != fingerprint:
+            with open(stamp_file, 'w', encoding='utf-8') as f:
+                json.dump(fingerprint, f)
+        return False
+
+    # Install the model from the local file
+    argostranslate.package.install_from_path(model_file)
+    with open(stamp_file, 'w', encoding='utf-8') as f:
+        json.dump(fingerprint, f)
+    logging.info(f"{from_code}-to-{to_code} translation model installed from local file.")
+    return True
+
+
+# Function to load the Vosk speech recognition model
+def load_model(path=None):
+    from vosk import Model
+    return Model(path or model_path)
+
+
+# Argos translation for a language pair, through English when there is no direct package
+def load_translation(from_code, to_code):
+    import argostranslate.translate
+    return argostranslate.translate.get_translation_from_codes(from_code, to_code)
+
+
+model_registry = ModelRegistry(os.path.join(application_path, 'models'),
+                               memory_budget=MODEL_MEMORY_BUDGET_MB * 1024 * 1024 if MODEL_MEMORY_BUDGET_MB else None,
+                               load_vosk=load_model, load_translation=load_translation)
+model_registry.register(DEFAULT_LANGUAGE, vosk_path=model_path)
+
+
+# The models every engine needs, installed/loaded once per process no matter how many
+# engines, loaders or windows ask for them at the same time
+_startup_lock = threading.Lock()
+_translation_pairs_ready = set()
+
+
+# Whether there is an Argos package straight from from_code to to_code, or the pair has to go through English
+def has_direct_translation(from_code, to_code):
+    return (from_code == 'en' or to_code == 'en'
+            or os.path.exists(model_registry.argos_package_path(from_code, to_code)))
+
+
+# Install the Argos package(s) for a language pair. Without a direct package the pair is
+# translated through English, so the packages to and from English are installed instead.
+def ensure_translation_model(from_code='ru', to_code='en'):
+    with _startup_lock:
+        if (from_code, to_code) in _translation_pairs_ready:
+            return "already installed"
+        if has_direct_translation(from_code, to_code):
+            pairs = [(from_code, to_code)]
+        else:
+            pairs = [(from_code, 'en'), ('en', to_code)]
+        installed = False
+        for pair in pairs:
+            installed = install_translation_package(*pair) or installed
+        _translation_pairs_ready.add((from_code, to_code))
+        return "installed" if installed else "already installed"
+
+
+# Startup steps for startup.BackgroundLoader: the Argos packages from the stream's language to each
+# target (a list or a comma separated string) and the Vosk model of the stream's language
+def model_loading_steps(language_code='ru-RU', targets='en'):
+    source_language = base_language(language_code)
+    target_languages = parse_targets(targets)
+
+    def install_translation_models():
+        results = [ensure_translation_model(source_language, target) for target in target_languages]
+        return "installed" if "installed" in results else "already installed"
+
+    return [
+        ('argos_install', install_translation_models),
+        ('vosk_model', lambda: model_registry.get(source_language)),
+    ]
+
+
+# Resolved stream URLs are reused on reconnect until they are about to expire.
+# The cheapest audio-only format of at least STREAM_MIN_AUDIO_BITRATE kbit/s is preferred.
+STREAM_MIN_AUDIO_BITRATE = 48
+stream_resolver = StreamResolver(min_audio_bitrate=STREAM_MIN_AUDIO_BITRATE)
+
+
+# Grabs the audio from the url
+def get_audio_stream(youtube_url, refresh=False):
+    return stream_resolver.resolve(youtube_url, refresh=refresh)
+
+
+# A paragraph's sentences, split the way Argos's apply_packaged_translation splits them before it translates.
+# stanza_pipeline is the stanza tokenizer for the package when Argos uses stanza, made once per batch.
+def argos_sentences(pkg, paragraph, stanza_pipeline=None):
+    if getattr(pkg, 'type', None) == 'sbd':
+        return [paragraph]
+    if stanza_pipeline is not None:
+        return [sentence.text for sentence in stanza_pipeline(paragraph).sentences]
+    from argostranslate import sbd
+    from argostranslate.translate import PackageTranslation
+
+    sbd_translation = PackageTranslation(None, None, sbd.get_sbd_package())
+    sentences = []
+    start_index = 0
+    while start_index < len(paragraph) - 1:
+        detected_index = sbd.detect_sentence(paragraph[start_index:], sbd_translation)
+        end_index = start_index + (detected_index if detected_index != -1 else 250)  # Argos's default length
+        sentences.append(paragraph[start_index:end_index])
+        start_index = end_index
+    return sentences
+
+
+# Translate several texts with a single CTranslate2 batch when Argos has a direct package for the pair.
+# The texts are split into paragraphs and sentences and put back together exactly as Argos does for one
+# text, so a text comes out the same whether it was batched or not (whichever comes first gets cached).
+# Anything else (a pivot through another language, an older Argos) falls back to one text at a time.
+def argos_translate_batch(texts, from_code, to_code):
+    import argostranslate.settings
+
+    translation = model_registry.get_translation(from_code, to_code)
+    package_translation = getattr(translation, 'underlying', translation)  # Argos wraps it in a CachedTranslation
+    pkg = getattr(package_translation, 'pkg', None)
+    tokenizer = getattr(pkg, 'tokenizer', None)
+    if len(texts) == 1 or tokenizer is None or not hasattr(package_translation, 'translator'):
+        return [translation.translate(text) for text in texts]
+
+    try:
+        device = getattr(argostranslate.settings, 'device', 'cpu')
+        if package_translation.translator is None:
+            import ctranslate2
+            package_translation.translator = ctranslate2.Translator(str(pkg.package_path / "model"), device=device)
+        stanza_pipeline = None
+        if getattr(pkg, 'type', None) != 'sbd' and argostranslate.settings.stanza_available:
+            import stanza
+            stanza_pipeline = stanza.Pipeline(lang=pkg.from_code, dir=str(pkg.package_path / "stanza"),
+                                              processors="tokenize", use_gpu=device == "cuda", logging_level="WARNING")
+        # [text][paragraph][sentence]
+        sentences = [[argos_sentences(pkg, paragraph, stanza_pipeline) for paragraph in text.split('\n')]
+                     for text in texts]
+        tokenized = [tokenizer.encode(sentence) for text_sentences in sentences
+                     for paragraph_sentences in text_sentences for sentence in paragraph_sentences]
+        target_prefix = getattr(pkg, 'target_prefix', '')
+        results = package_translation.translator.translate_batch(
+            tokenized, replace_unknowns=True, max_batch_size=32, beam_size=4, num_hypotheses=1,
+            length_penalty=0.2, target_prefix=[[target_prefix]] * len(tokenized) if target_prefix else None)
+        hypotheses = iter([result.hypotheses[0] if hasattr(result, 'hypotheses') else result[0]['tokens']
+                           for result in results])
+        translated_texts = []
+        for text_sentences in sentences:
+            translated_paragraphs = []
+            for paragraph_sentences in text_sentences:
+                translated = tokenizer.decode([token for _ in paragraph_sentences for token in next(hypotheses)])
+                if target_prefix and translated.startswith(target_prefix):
+                    translated = translated[len(target_prefix):]
+                if translated.startswith(' '):
+                    translated = translated[1:]  # Added by the tokenizer
+                translated_paragraphs.append(translated)
+            translated_texts.append('\n'.join(translated_paragraphs).lstrip('\n'))
+        return translated_texts
+    except Exception as e:
+        logging.warning(f"Batched Argos translation unavailable, translating one by one: {e}")
+        return [translation.translate(text) for text in texts]
+
+
+translation_batcher = TranslationBatcher(argos_translate_batch, max_batch_size=TRANSLATION_BATCH_SIZE,
+                                         max_wait=TRANSLATION_BATCH_WAIT, parallel_pairs=TRANSLATION_PARALLEL_PAIRS)
+
+
+# Function to translate text
+def translate_text(text, target_language='en', source_language='ru'):
+    if not text.strip():
+        return None  # Skip translation if there's no text
+
+    try:
+        # Perform translation using Argos Translate, unless the phrase has been translated before
+        with translate_seconds.time():
+            translated_text = translation_cache.translate(
+                source_language, target_language, text,
+                lambda uncached_text: translation_batcher.translate(uncached_text, source_language, target_language))
+        return translated_text
+    except Exception as e:
+        translation_errors.inc()
+        logging.error(f"Translation Error: {e}")
+        return f"Translation Error: {e}"
+
+
+# Function to translate several texts at once, the uncached ones go to Argos as one batch.
+# A failed batch comes back as "Translation Error: ..." texts, or is raised with raise_errors.
+def translate_texts(texts, target_language='en', source_language='ru', raise_errors=False):
+    texts = [text.strip() for text in texts]
+    translations = [None] * len(texts)
+    wanted = [index for index, text in enumerate(texts) if text]
+    try:
+        with translate_seconds.time():
+            results = translation_cache.translate_many(
+                source_language, target_language, [texts[index] for index in wanted],
+                lambda uncached_texts: translation_batcher.translate_many(uncached_texts, source_language,
+                                                                         target_language))
+    except Exception as e:
+        translation_errors.inc()
+        logging.error(f"Translation Error: {e}")
+        if raise_errors:
+            raise
+        results = [f"Translation Error: {e}"] * len(wanted)
+    for index, translated_text in zip(wanted, results):
+        translations[index] = translated_text
+    return translations
+
+
+# translate_texts for FanoutTranslator, which needs a failed translation raised rather than returned as text
+def fanout_translate_texts(texts, target_language, source_language):
+    return translate_texts(texts, target_language, source_language, raise_errors=True)
+
+
+# Whether this Vosk build accepts a buffer in AcceptWaveform, None until the first call finds out
+_waveform_takes_buffer = None
+
+
+# Feed one chunk to Vosk without copying it when the binding can read the buffer directly.
+# Older bindings only take bytes; then the chunk is copied once and the reader counts the copy.
+def accept_waveform(recognizer, chunk, pcm_reader):
+    global _waveform_takes_buffer
+    with accept_waveform_seconds.time():
+        if _waveform_takes_buffer is not False:
+            try:
+                is_final = recognizer.AcceptWaveform(chunk)
+                _waveform_takes_buffer = True
+                return is_final
+            except TypeError:
+                if _waveform_takes_buffer:
+                    raise
+                _waveform_takes_buffer = False
+        return recognizer.AcceptWaveform(pcm_reader.copy(chunk))
+
+
+# Final result item from a Vosk result. Vosk times words from the start of the audio it was fed,
+# so the first and last word (plus offset, the stream audio the recognizer never heard) give the
+# utterance's place in the stream. Without word timings only the end is known, from how much
+# audio had been recognized.
+def final_item(result_dict, audio_seconds, offset=0.0):
+    item = {'type': 'final', 'recognized': result_dict.get('text', ''), 'end': audio_seconds}
+    words = result_dict.get('result')
+    if words:
+        item['start'] = words[0]['start'] + offset
+        item['end'] = words[-1]['end'] + offset
+    return item
+
+
+# Recognition and translation of one live stream, without any user interface.
+# Results are handed out as event dicts, either to the on_event callback or through events():
+#   {'type': 'partial', 'recognized': ..., 'translated': ..., 'time': ...}  utterance in progress
+#   {'type': 'final', 'recognized': ..., 'translated': ..., 'time': ...}    finished utterance
+#   {'type': 'notice', 'text': ..., 'time': ...}                             e.g. long silence
+#   {'type': 'notice', 'text': ..., 'gap_start': ..., 'gap_end': ...}         audio dropped to catch up
+#   {'type': 'status', 'text': ..., 'time': ...}                             engine state changes
+# Partial results also carry 'end', the seconds of stream audio recognized when they were produced.
+# Final results carry 'start' and 'end' of the utterance in stream seconds, from Vosk's word timings.
+# target_language may name several languages (a list, or comma separated like 'en,uk,pl'): the stream
+# is still recognized once and every final result is translated into all of them at the same time.
+# Final results then also carry 'translations', {language: text}, and 'translated' is the first
+# language's text; partial results are only translated into the first language.
+# Callbacks run on the engine's worker threads, not on the caller's thread.
+# When stream_id is given every event also carries it as 'stream'. decode_slots is an optional
+# semaphore shared between engines to cap how many Vosk decodes run at the same time.
+# load_shedding (policies from load_shedding.POLICIES, () for none) and latency_budget default to
+# LOAD_SHEDDING_POLICIES and LATENCY_BUDGET_SECONDS.
+class LiveTranslatorEngine:
+    def __init__(self, youtube_url, language_code='ru-RU', target_language='en', model=None,
+                 on_event=None, max_retries=5, stage_config=None, stream_id=None, decode_slots=None,
+                 load_shedding=None, latency_budget=None):
+        self.youtube_url = youtube_url
+        self.stream_id = stream_id
+        self.decode_slots = decode_slots
+        self.language_code = language_code
+        self.source_language = base_language(language_code)
+        self.target_languages = parse_targets(target_language)
+        self.target_language = self.target_languages[0]
+        self.fanout = None
+        self.model = model
+        self.model_acquired = False  # Whether self.model was taken from the registry and must be given back
+        self.small_model = None
+        self.load_shedding = LOAD_SHEDDING_POLICIES if load_shedding is None else tuple(load_shedding)
+        self.latency_budget = latency_budget or LATENCY_BUDGET_SECONDS
+        self.shedder = None
+        self.max_retries = max_retries
+        self.stage_config = stage_config or PIPELINE_STAGES
+        self.callbacks = [on_event] if on_event else []
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+        self.capture = None
+        self.stop_flag = False
+        self.pipeline = None
+        self.thread = None
+        self.finished = threading.Event()
+
+    # Register another callback for events
+    def add_listener(self, on_event):
+        self.callbacks.append(on_event)
+
+    def _emit(self, event):
+        event.setdefault('time', time.time())
+        if self.stream_id is not None:
+            event.setdefault('stream', self.stream_id)
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                logging.exception(f"Event callback failed: {e}")
+        with self.subscribers_lock:
+            for subscriber in self.subscribers:
+                subscriber.put(event)
+
+    def _status(self, text):
+        self._emit({'type': 'status', 'text': text})
+
+    # Iterate over events until the engine stops.
+    # The subscription starts when events() is called, so call it before start() to see every event.
+    def events(self):
+        subscriber = queue.Queue()
+        with self.subscribers_lock:
+            self.subscribers.append(subscriber)
+
+        def iterate():
+            try:
+                while True:
+                    try:
+                        event = subscriber.get(timeout=0.5)
+                    except queue.Empty:
+                        if self.finished.is_set():
+                            return
+                        continue
+                    if event is None:
+                        return
+                    yield event
+            finally:
+                with self.subscribers_lock:
+                    self.subscribers.remove(subscriber)
+
+        return iterate()
+
+    # Start translating on a background thread
+    def start(self):
+        self.stop_flag = False
+        self.finished.clear()
+        self.thread = threading.Thread(target=self.run, name='live-translator', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_flag = True
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        if self.capture is not None:
+            logging.info("Stopping ffmpeg process...")
+            self.capture.stop()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # Calls upon the function to get the audio, the capture supervisor decides when
+    def _start_ffmpeg_process(self, refresh=False):
+        stream_url = get_audio_stream(self.youtube_url, refresh=refresh)
+        logging.debug(f"Stream URL: {stream_url}")
+
+        # post processesing on audio, so it can be better recognized.
+        ffmpeg_command = [
+            'ffmpeg',
+            '-i', stream_url,
+            '-af', 'volume=1.5,acompressor,aresample=16000',
+            '-f', 's16le',
+            '-acodec', 'pcm_s16le',
+            '-ar', '16000',
+            '-ac', '1',
+            'pipe:1'
+        ]
+        logging.debug(f"Running ffmpeg command: {' '.join(ffmpeg_command)}")
+        # Unbuffered so readinto() goes straight from the pipe into our buffers
+        return subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+    # Capture stage: only drains the ffmpeg pipe, so slow recognition or translation never stalls the reader.
+    # Chunks are memoryviews into the capture ring and go back to it once recognized (or dropped).
+    # Reconnecting happens inside read(); None means the engine was stopped or ran out of retries.
+    def _read_audio(self):
+        with capture_read_seconds.time():
+            chunk = self.capture.read()
+        if chunk is not None:
+            ingested_bytes.inc(len(chunk))
+        return chunk
+
+    # Runs the whole capture -> recognize -> translate -> emit pipeline and blocks until it ends
+    def run(self):
+        try:
+            self._run()
+        finally:
+            if self.model_acquired:
+                model_registry.release(self.source_language)
+                self.model = None
+                self.model_acquired = False
+            if self.small_model is not None:
+                model_registry.release(self.source_language, small=True)
+                self.small_model = None
+            if self.fanout is not None:
+                self.fanout.close()
+            self.finished.set()
+            with self.subscribers_lock:
+                for subscriber in self.subscribers:
+                    subscriber.put(None)
+
+    # Wait for the shared models of the stream's language, returns False (and reports why) if they cannot be loaded
+    def _load_models(self):
+        if (any((self.source_language, target) not in _translation_pairs_ready for target in self.target_languages)
+                or (self.model is None and not model_registry.is_loaded(self.source_language))):
+            self._status("Loading models...")
+        try:
+            for target in self.target_languages:
+                ensure_translation_model(self.source_language, target)
+            if self.model is None:
+                self.model = model_registry.acquire(self.source_language)
+                self.model_acquired = True
+        except Exception as e:
+            logging.exception(f"Could not load models: {e}")
+            self._status(f"Error - could not load models: {e}")
+            return False
+        return True
+
+    def _create_recognizer(self, model=None):
+        from vosk import KaldiRecognizer
+        recognizer = KaldiRecognizer(model or self.model, 16000)
+        recognizer.SetWords(True)
+        return recognizer
+
+    def _run(self):
+        # Start pulling audio first so resolving the stream overlaps with loading the models
+        self.capture = CaptureSupervisor(self._start_ffmpeg_process, chunk_size=AUDIO_CHUNK_SIZE,
+                                         slots=self.stage_config['recognize']['maxsize'] + 2,
+                                         max_retries=self.max_retries, base_delay=RECONNECT_BASE_DELAY,
+                                         max_delay=RECONNECT_MAX_DELAY, on_status=self._status)
+        if self.stop_flag:
+            return
+        self.capture.start()
+
+        if not self._load_models():
+            self.stop()
+            return
+        recognizer = self._create_recognizer()
+
+        last_activity_time = time.time()  # Track last time something was recognized
+        audio_seconds = 0.0  # Stream audio fed to the recognizer so far, and the audio lost to reconnects
+        received_seconds = 0.0  # The same without the lost audio, as capture counts it
+        gaps_applied = 0  # Reconnect gaps in self.capture.audio_gaps already added to audio_seconds
+        pcm_reader = self.capture.reader
+
+        # Seconds the recognizer is behind the stream. The recognize queue only holds about 30 seconds and
+        # once it is full capture stops reading, so the rest of the backlog waits in ffmpeg and the network
+        # where the queue cannot see it. It is measured against the clock instead, from the last time capture
+        # saw the stream live (see CaptureSupervisor.lag_seconds), so a stream that stalls or reconnects does
+        # not count as backlog. The queue depth covers a stream that delivers faster than real time.
+        def backlog_seconds():
+            queued = recognize_stage.depth() * AUDIO_CHUNK_SIZE / 32000
+            return max(queued, self.capture.lag_seconds(received_seconds))
+
+        def shedding_changed(shedding):
+            self._status("Falling behind the stream, shedding load..." if shedding else "Caught up with the stream")
+
+        self.shedder = shedder = LoadShedder(backlog_seconds, self.load_shedding, budget=self.latency_budget,
+                                             on_change=shedding_changed)
+        if SMALLER_MODEL in self.load_shedding:
+            if model_registry.has_small_model(self.source_language):
+                # Loaded up front, so switching to it costs nothing when the engine falls behind
+                self.small_model = model_registry.acquire(self.source_language, small=True)
+            else:
+                logging.info(f"No small model at {model_registry.vosk_path(self.source_language, small=True)}, "
+                             f"load shedding will not switch models")
+        using_small_model = False
+        # Stream seconds the current recognizer did not hear (skipped, dropped or lost audio, or audio before
+        # it was created); added to its word timings. Silence is only skipped well into a pause, after Vosk
+        # has normally ended the utterance, and an utterance is ended before audio is dropped.
+        clock_offset = 0.0
+        gap_start = None  # Stream seconds where the audio being dropped started
+
+        # End the utterance in progress, e.g. before a gap or a model switch
+        def flush_utterance():
+            return final_item(json.loads(recognizer.FinalResult()), audio_seconds, clock_offset)
+
+        # Recognition stage: feeds Vosk and passes on final results and changed partial hypotheses
+        def recognize_audio(chunk):
+            nonlocal last_activity_time, audio_seconds, received_seconds, gaps_applied, clock_offset, gap_start
+            nonlocal recognizer, using_small_model
+            chunk_seconds = len(chunk) / 32000  # 16 kHz, 16-bit mono
+            items = []
+            # The stream went on while capture was reconnecting: end the utterance before the gap
+            # and move the stream clock past it, so later cues keep their place in the stream
+            audio_gaps = self.capture.audio_gaps
+            while gaps_applied < len(audio_gaps) and audio_gaps[gaps_applied][0] <= received_seconds + 1e-6:
+                items.append(flush_utterance())
+                audio_seconds += audio_gaps[gaps_applied][1]
+                clock_offset += audio_gaps[gaps_applied][1]
+                gaps_applied += 1
+            received_seconds += chunk_seconds
+
+            action = shedder.check(chunk)
+            if action != FEED:
+                pcm_reader.release(chunk)
+                if action == DROP and gap_start is None:
+                    gap_start = audio_seconds
+                    items.append(flush_utterance())
+                audio_seconds += chunk_seconds
+                clock_offset += chunk_seconds
+                return items or None
+
+            if gap_start is not None:
+                items.append({'type': 'notice', 'gap_start': round(gap_start, 3), 'gap_end': round(audio_seconds, 3),
+                              'text': f"[Skipped {audio_seconds - gap_start:.1f}s of audio to catch up with the stream]"})
+                gap_start = None
+            if self.small_model is not None and shedder.use_smaller_model() != using_small_model:
+                items.append(flush_utterance())
+                using_small_model = not using_small_model
+                recognizer = self._create_recognizer(self.small_model if using_small_model else None)
+                clock_offset = audio_seconds
+                logging.info(f"Recognizing with the {'small' if using_small_model else 'full'} model")
+            audio_seconds += chunk_seconds
+            try:
+                if self.decode_slots is not None:
+                    with self.decode_slots:
+                        is_final = accept_waveform(recognizer, chunk, pcm_reader)
+                else:
+                    is_final = accept_waveform(recognizer, chunk, pcm_reader)
+            finally:
+                pcm_reader.release(chunk)
+
+            if is_final:
+                self._status("Translating...")  # Update status to show translation is ongoing
+                item = final_item(json.loads(recognizer.Result()), audio_seconds, clock_offset)
+                recognized_text = item['recognized']
+                final_results.inc()
+            elif shedder.skip_partials():
+                # Building a partial result costs Vosk time, and translating it costs more
+                item, recognized_text = None, ''
+            else:
+                result_dict = json.loads(recognizer.PartialResult())  # Handle partial results
+                recognized_text = result_dict.get('partial', '')
+                item = {'type': 'partial', 'recognized': recognized_text, 'end': audio_seconds} if recognized_text else None
+                if item is not None:
+                    partial_results.inc()
+
+            if recognized_text:
+                last_activity_time = time.time()  # Reset inactivity timer
+            else:
+                current_time = time.time()
+                if current_time - last_activity_time > 300:  # 5 minutes of inactivity
+                    last_activity_time = current_time
+                    item = {'type': 'notice', 'text': "No speech detected for 5 minutes..."}
+            return items + [item] if items else item
+
+        # Translation stage. Partials only get their newly stabilized words translated,
+        # the whole utterance is translated once when the final result arrives.
+        partial_tracker = partials.PartialTracker()
+        live_translation = []
+        self.fanout = fanout = FanoutTranslator(fanout_translate_texts, self.target_languages, has_direct_translation)
+
+        # Translate final results into every target language in one go
+        def translate_finals(finals):
+            translations = fanout.translate_many([item['recognized'].strip() for item in finals], self.source_language)
+            for index, item in enumerate(finals):
+                item['translations'] = {target: translations[target][index] or '' for target in fanout.targets}
+                item['translated'] = translations[self.target_language][index]
+
+        def translate_result(item):
+            if item['type'] == 'partial':
+                changed, span = partial_tracker.update(item['recognized'])
+                if span:
+                    translated_span = translate_text(span, target_language=self.target_language,
+                                                     source_language=self.source_language)
+                    if translated_span:
+                        live_translation.append(translated_span)
+                elif not changed:
+                    return None  # Nothing new to show
+                item['translated'] = ' '.join(live_translation)
+                return item
+
+            if item['type'] == 'final':
+                had_partial = bool(partial_tracker.last_partial)
+                partial_tracker.reset()
+                live_translation.clear()
+                if not item['recognized'].strip():
+                    # Nothing was recognized after all, consumers only need to drop the live line
+                    return dict(item, translated='') if had_partial else None
+                if 'translated' not in item:
+                    translate_finals([item])
+                if not any(item['translations'].values()):
+                    return dict(item, recognized='', translated='', translations={})
+            return item
+
+        # Works on everything that queued up while the previous batch was being translated:
+        # all final results are translated in one batch per target language, and partials that
+        # a later final in the same batch has already replaced are skipped.
+        def translate_results(items):
+            last_final = max((index for index, item in enumerate(items) if item['type'] == 'final'), default=-1)
+            finals = [item for item in items if item['type'] == 'final' and item['recognized'].strip()]
+            if finals:
+                translate_finals(finals)
+            return [translate_result(item) for index, item in enumerate(items)
+                    if item['type'] != 'partial' or index > last_final]
+
+        # Flush whatever Vosk still holds once the stream ends
+        def finish_recognition():
+            return flush_utterance()
+
+        translation_pipeline = pipeline.Pipeline('translator')
+        translation_pipeline.set_source('capture', self._read_audio)
+        translation_pipeline.add_stage('recognize', recognize_audio, finish=finish_recognition,
+                                       on_drop=pcm_reader.release, **self.stage_config['recognize'])
+        translation_pipeline.add_stage('translate', translate_results, **self.stage_config['translate'])
+        translation_pipeline.add_stage('emit', self._emit, **self.stage_config['emit'])
+        self.pipeline = translation_pipeline
+        backlog_labels = {'stream': self.stream_id if self.stream_id is not None else 'default'}
+        recognize_stage = translation_pipeline.stages[0]
+        metrics.gauge('translator_backlog_seconds', "Audio waiting to be recognized, in seconds",
+                      func=backlog_seconds, **backlog_labels)
+        translation_pipeline.start()
+
+        # Periodically report queue depths so a starved stage shows up as a growing queue
+        while translation_pipeline.is_running():
+            translation_pipeline.join(timeout=PIPELINE_REPORT_INTERVAL)
+            # The stats are only gathered (and the lines only formatted, on the log thread) when debug logging is on
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Pipeline queues: %s", translation_pipeline.stats())
+                logging.debug("Translation cache: %s", translation_cache.stats())
+                logging.debug("Translation batches: %s", translation_batcher.stats())
+                logging.debug("PCM reader: %s", pcm_reader.stats())
+                logging.debug("Capture: %s", self.capture.stats())
+                logging.debug("Models: %s", model_registry.stats())
+                logging.debug("Load shedding: %s", shedder.stats())
+                logging.debug("Fan-out: %s", fanout.stats())
+            if not self.stop_flag and translation_pipeline.is_running():
+                behind = f", {shedder.lag:.0f}s behind, shedding load" if shedder.shedding else ""
+                self._status(f"Translating... (queues: {translation_pipeline.report()}{behind})")
+        metrics.registry.remove('translator_backlog_seconds', **backlog_labels)
@@ -0,0 +1,105 @@
+import threading
+import logging
+import concurrent.futures
+import metrics
+
+PIVOT_LANGUAGE = 'en'
+
+pivoted_texts = metrics.counter('translator_pivoted_texts_total',
+                                "Texts translated through the English intermediate instead of directly")
+
+
+# ['en', 'uk', 'pl'] from 'en,uk,pl' (or from a list), without repeats
+def parse_targets(targets):
+    if isinstance(targets, str):
+        targets = targets.split(',')
+    targets = list(dict.fromkeys(target.strip() for target in targets if target and target.strip()))
+    if not targets:
+        raise ValueError("No target language given")
+    return targets
+
+
+# Translates the same sentences into several target languages from one recognition pass.
+# translate_texts(texts, target_language, source_language) does the actual (cached, batched) work and
+# must raise when it fails; has_direct(source, target) says whether there is an Argos package for the pair.
+# Targets with a direct package are translated straight from the source; the rest go through English, and
+# the English translation is made once and reused by all of them (it is also the 'en' output when English
+# is a target). All targets are translated at the same time, pivoted ones as soon as the English text is ready.
+# A target whose translation fails gets "Translation Error: ..." for every text. When the English step fails
+# the targets that depend on it fail with it, so error text is never translated further or cached.
+class FanoutTranslator:
+    def __init__(self, translate_texts, targets, has_direct, pivot=PIVOT_LANGUAGE):
+        self.translate_texts = translate_texts
+        self.targets = parse_targets(targets)
+        self.has_direct = has_direct
+        self.pivot = pivot
+        self.executor = None
+        if len(self.targets) > 1:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(self.targets),
+                                                                  thread_name_prefix='fanout')
+        self.lock = threading.Lock()
+        self.direct = 0
+        self.pivoted = 0
+
+    # Whether target is reached through the pivot language from source
+    def pivots(self, source, target):
+        return self.pivot not in (source, target) and not self.has_direct(source, target)
+
+    # {target: [translation of every text]} for all targets
+    def translate_many(self, texts, source):
+        if self.executor is None:
+            translations = {}
+            for target in self.targets:
+                try:
+                    translations[target] = self._translate(texts, source, target, None)
+                except Exception as e:
+                    translations[target] = self._failed(texts, source, target, e)
+            return translations
+
+        pivot_future = None
+        if any(self.pivots(source, target) for target in self.targets):
+            pivot_future = self.executor.submit(self.translate_texts, texts, self.pivot, source)
+        futures = {}
+        for target in self.targets:
+            if target == self.pivot and pivot_future is not None:
+                futures[target] = pivot_future
+            else:
+                futures[target] = self.executor.submit(self._translate, texts, source, target, pivot_future)
+        translations = {}
+        for target, future in futures.items():
+            try:
+                translations[target] = future.result()
+            except Exception as e:
+                translations[target] = self._failed(texts, source, target, e)
+        return translations
+
+    def _failed(self, texts, source, target, error):
+        logging.error(f"Translation {source}->{target} failed: {error}")
+        return [f"Translation Error: {error}"] * len(texts)
+
+    # Raises when the translation (or the English step it depends on) fails
+    def _translate(self, texts, source, target, pivot_future):
+        if target == source:
+            return list(texts)
+        if not self.pivots(source, target):
+            with self.lock:
+                self.direct += len(texts)
+            return self.translate_texts(texts, target, source)
+        intermediate = pivot_future.result() if pivot_future is not None else self.translate_texts(texts, self.pivot, source)
+        wanted = [index for index, text in enumerate(intermediate) if text]
+        translations = [None] * len(texts)
+        results = self.translate_texts([intermediate[index] for index in wanted], target, self.pivot) if wanted else []
+        for index, translated_text in zip(wanted, results):
+            translations[index] = translated_text
+        with self.lock:
+            self.pivoted += len(texts)
+        pivoted_texts.inc(len(texts))
+        return translations
+
+    def stats(self):
+        with self.lock:
+            return {'targets': self.targets, 'direct': self.direct, 'pivoted': self.pivoted}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,159 @@
+import time
+import logging
+import numpy as np
+import metrics
+
+# What the engine may give up to catch up with the live stream, cheapest loss first
+SKIP_PARTIALS = 'skip_partials'    # no partial results: Vosk skips building them and nothing is translated live
+SKIP_SILENCE = 'skip_silence'      # silence past the first keep_silence seconds never reaches Vosk
+SMALLER_MODEL = 'smaller_model'    # recognize with the language's small Vosk model until caught up
+DROP_OLDEST = 'drop_oldest'        # over max_lag, throw the oldest audio away and show a gap instead
+POLICIES = (SKIP_PARTIALS, SKIP_SILENCE, SMALLER_MODEL, DROP_OLDEST)
+
+# What to do with one chunk of audio
+FEED = 'feed'
+SKIP = 'skip'
+DROP = 'drop'
+
+shedding_episodes = metrics.counter('translator_shedding_episodes_total', "Times the engine fell behind its latency budget")
+skipped_silence_seconds = metrics.counter('translator_shed_seconds_total', "Audio not recognized to keep up, in seconds",
+                                          policy=SKIP_SILENCE)
+dropped_seconds = metrics.counter('translator_shed_seconds_total', "Audio not recognized to keep up, in seconds",
+                                  policy=DROP_OLDEST)
+skipped_partials = metrics.counter('translator_skipped_partials_total', "Partial results skipped to keep up")
+
+
+def parse_policies(text):
+    if not text or text == 'none':
+        return ()
+    policies = tuple(policy.strip() for policy in text.split(',') if policy.strip())
+    unknown = [policy for policy in policies if policy not in POLICIES]
+    if unknown:
+        raise ValueError(f"Unknown load shedding policy {', '.join(unknown)}, expected some of {', '.join(POLICIES)}")
+    return policies
+
+
+# RMS level of a chunk of 16-bit PCM (bytes or memoryview), without copying it
+def chunk_level(chunk):
+    samples = np.frombuffer(chunk, dtype=np.int16)
+    if not samples.size:
+        return 0.0
+    samples = samples.astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples)))
+
+
+# Keeps caption lag bounded. backlog() returns how many seconds the recognizer is behind the live stream
+# (the engine measures it against the clock, so it is not capped by any queue); check() is called for
+# every chunk and says whether to feed it to Vosk, skip it or drop it.
+# Shedding starts once the backlog is over budget seconds and stops once it is back under
+# budget * recover_ratio, so the engine does not flip back and forth around the budget. While shedding,
+# the configured policies apply, except drop_oldest, which only starts dropping over max_lag seconds and
+# then drops until the backlog is back under the recover level. Dropping a budget's worth of audio should
+# take about that much off the backlog; when it does not, the audio is not waiting here to be dropped
+# (e.g. the stream itself is late), so dropping stops until the backlog has been under max_lag again.
+class LoadShedder:
+    def __init__(self, backlog, policies=(SKIP_PARTIALS, SKIP_SILENCE, DROP_OLDEST), budget=5.0, max_lag=None,
+                 recover_ratio=0.5, keep_silence=0.6, silence_level=300.0, on_change=None):
+        self.backlog = backlog
+        self.policies = tuple(policies)
+        self.budget = budget
+        self.max_lag = max_lag if max_lag is not None else budget * 2
+        self.recover_level = budget * recover_ratio
+        self.keep_silence = keep_silence
+        self.silence_level = silence_level
+        self.on_change = on_change
+        self.shedding = False
+        self.dropping = False
+        self.drop_stalled = False  # Dropping did not bring the backlog down
+        self.drop_window_lag = 0.0  # Backlog when the current window of dropped audio started
+        self.drop_window_seconds = 0.0
+        self.shedding_since = None
+        self.silence_run = 0.0
+        self.lag = 0.0
+        self.episodes = 0
+        self.shedding_seconds = 0.0
+        self.skipped_seconds = 0.0
+        self.dropped_seconds = 0.0
+        self.skipped_partials = 0
+
+    def enabled(self, policy):
+        return policy in self.policies
+
+    def _update(self):
+        self.lag = self.backlog()
+        if not self.shedding and self.lag > self.budget:
+            self.shedding = True
+            self.shedding_since = time.monotonic()
+            self.episodes += 1
+            shedding_episodes.inc()
+            logging.warning(f"{self.lag:.1f}s behind the stream, over the {self.budget:.1f}s budget: "
+                            f"shedding load ({', '.join(self.policies)})")
+            if self.on_change:
+                self.on_change(True)
+        elif self.shedding and self.lag <= self.recover_level:
+            self.shedding = False
+            self.dropping = False
+            self.drop_stalled = False
+            self.shedding_seconds += time.monotonic() - self.shedding_since
+            logging.info(f"Caught up ({self.lag:.1f}s behind), back to full recognition")
+            if self.on_change:
+                self.on_change(False)
+        if self.dropping and self.drop_window_seconds >= self.budget:
+            if self.lag > self.drop_window_lag - self.drop_window_seconds / 2:
+                self.dropping = False
+                self.drop_stalled = True
+                logging.warning(f"Dropped {self.drop_window_seconds:.1f}s of audio but still {self.lag:.1f}s behind "
+                                f"the stream, no longer dropping")
+            self.drop_window_lag = self.lag
+            self.drop_window_seconds = 0.0
+        if self.drop_stalled and self.lag <= self.max_lag:
+            self.drop_stalled = False
+        if (self.shedding and self.enabled(DROP_OLDEST) and self.lag > self.max_lag
+                and not self.dropping and not self.drop_stalled):
+            self.dropping = True
+            self.drop_window_lag = self.lag
+            self.drop_window_seconds = 0.0
+
+    # FEED, SKIP or DROP for the next chunk of audio
+    def check(self, chunk):
+        if not self.policies:
+            return FEED
+        self._update()
+        seconds = len(chunk) / 32000  # 16 kHz, 16-bit mono
+        if self.dropping:
+            self.drop_window_seconds += seconds
+            self.dropped_seconds += seconds
+            dropped_seconds.inc(seconds)
+            return DROP
+        if self.shedding and self.enabled(SKIP_SILENCE):
+            if chunk_level(chunk) < self.silence_level:
+                self.silence_run += seconds
+                # Keep the start of every pause, Vosk needs it to notice the utterance has ended
+                if self.silence_run > self.keep_silence:
+                    self.skipped_seconds += seconds
+                    skipped_silence_seconds.inc(seconds)
+                    return SKIP
+            else:
+                self.silence_run = 0.0
+        return FEED
+
+    # Whether to leave partial results out right now
+    def skip_partials(self):
+        if self.shedding and self.enabled(SKIP_PARTIALS):
+            self.skipped_partials += 1
+            skipped_partials.inc()
+            return True
+        return False
+
+    # Whether to recognize with the small model right now
+    def use_smaller_model(self):
+        return self.shedding and self.enabled(SMALLER_MODEL)
+
+    def stats(self):
+        shedding_seconds = self.shedding_seconds
+        if self.shedding:
+            shedding_seconds += time.monotonic() - self.shedding_since
+        return {'lag_seconds': round(self.lag, 2), 'shedding': self.shedding, 'dropping': self.dropping,
+                'episodes': self.episodes, 'shedding_seconds': round(shedding_seconds, 1),
+                'skipped_silence_seconds': round(self.skipped_seconds, 1),
+                'dropped_seconds': round(self.dropped_seconds, 1), 'skipped_partials': self.skipped_partials}
@@ -0,0 +1,285 @@
+import json
+import time
+import bisect
+import queue
+import threading
+import logging
+import logging.handlers
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the histogram buckets, from sub-millisecond reads up to slow translations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+
+# Holds a value that is set, or reads it from func whenever the metrics are collected
+class Gauge:
+    def __init__(self, func=None):
+        self.func = func
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.func is None:
+            return self.value
+        try:
+            return self.func()
+        except Exception:
+            return None
+
+
+# Counts observations per bucket; cheap enough to call once per audio chunk
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    # Time a block: with histogram.time(): ...
+    def time(self):
+        return _Timer(self)
+
+    def get(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return {'buckets': cumulative, 'sum': total, 'count': count}
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+# All metrics of the process, by name and label values.
+# counter()/gauge()/histogram() return the existing metric when called again with the same name and labels,
+# so code can look its metrics up once and keep them.
+class Registry:
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _get(self, kind, metric_class, name, help_text, labels, **kwargs):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, {'kind': kind, 'help': help_text, 'metrics': {}})
+            if family['kind'] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family['kind']}")
+            metric = family['metrics'].get(key)
+            if metric is None:
+                metric = family['metrics'][key] = metric_class(**kwargs)
+            return metric
+
+    def counter(self, name, help_text='', **labels):
+        return self._get('counter', Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', func=None, **labels):
+        gauge = self._get('gauge', Gauge, name, help_text, labels)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS, **labels):
+        return self._get('histogram', Histogram, name, help_text, labels, buckets=buckets)
+
+    # Forget one labelled metric, e.g. the backlog gauge of a stream that was removed
+    def remove(self, name, **labels):
+        with self.lock:
+            family = self.families.get(name)
+            if family is not None:
+                family['metrics'].pop(tuple(sorted(labels.items())), None)
+
+    def _collect(self):
+        with self.lock:
+            return [(name, family['kind'], family['help'], list(family['metrics'].items()))
+                    for name, family in sorted(self.families.items())]
+
+    # Prometheus text exposition format
+    def render_prometheus(self):
+        lines = []
+        for name, kind, help_text, metrics in self._collect():
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in metrics:
+                labels = dict(key)
+                value = metric.get()
+                if kind == 'histogram':
+                    for bound, count in value['buckets']:
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+                elif value is not None:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    # Plain dict for JSON output; histograms are reduced to count, sum and mean
+    def snapshot(self):
+        data = {}
+        for name, kind, _, metrics in self._collect():
+            for key, metric in metrics:
+                value = metric.get()
+                if kind == 'histogram':
+                    value = {'count': value['count'], 'sum': round(value['sum'], 6),
+                             'mean': round(value['sum'] / value['count'], 6) if value['count'] else None}
+                data[name + _format_labels(dict(key))] = value
+        return data
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+# The process wide registry everything reports to
+registry = Registry()
+
+
+def counter(name, help_text='', **labels):
+    return registry.counter(name, help_text, **labels)
+
+
+def gauge(name, help_text='', func=None, **labels):
+    return registry.gauge(name, help_text, func, **labels)
+
+
+def histogram(name, help_text='', buckets=DEFAULT_BUCKETS, **labels):
+    return registry.histogram(name, help_text, buckets, **labels)
+
+
+# Serves /metrics (Prometheus text) and /metrics.json on a local port from a background thread
+class MetricsServer:
+    def __init__(self, port=9464, host='127.0.0.1', metrics_registry=None):
+        source = metrics_registry or registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body = source.render_prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/metrics.json':
+                    body = json.dumps(source.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are not worth a log line each
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Hands write() one JSON line with a snapshot of every metric each interval seconds
+class JsonLinesReporter:
+    def __init__(self, write, interval=10, metrics_registry=None):
+        self.write = write
+        self.interval = interval
+        self.registry = metrics_registry or registry
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='metrics-reporter', daemon=True)
+        self.thread.start()
+        return self
+
+    def report(self):
+        line = json.dumps({'time': time.time(), 'metrics': self.registry.snapshot()}, ensure_ascii=False)
+        try:
+            self.write(line)
+        except Exception as e:
+            logging.error(f"Could not write metrics: {e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(1)
+            self.report()
+
+
+# QueueHandler formats every record on the calling thread before queueing it (so the record can be
+# pickled). The queue here never leaves the process, so the record is queued as it is and the
+# message is only put together by the listener thread.
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+# Log through a queue: callers only enqueue the record, a listener thread formats and writes it,
+# so a log call on the audio path never waits for the disk or spends time formatting. Hot-path
+# calls should pass their values as %-style arguments, not an f-string, so that work is deferred too.
+# Call stop() on the returned listener before exiting to flush what is still queued.
+def setup_queue_logging(filename=None, level=logging.DEBUG, filemode='a'):
+    if filename:
+        target = logging.FileHandler(filename, mode=filemode, encoding='utf-8')
+    else:
+        target = logging.StreamHandler()
+    target.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(_DeferredQueueHandler(log_queue))
+    root_logger.setLevel(level)
+    listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,202 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+import metrics
+
+model_loads = metrics.counter('translator_model_loads_total', "Vosk models and Argos translations loaded")
+model_evictions = metrics.counter('translator_model_evictions_total', "Idle models unloaded to stay in the memory budget")
+
+
+# 'ru-RU' -> 'ru': the dropdown and command lines use locale codes, models are per language
+def base_language(language_code):
+    return language_code.replace('_', '-').split('-')[0].lower()
+
+
+# Bytes a model directory or package takes on disk, used as the estimate of what it takes in memory
+def disk_size(path):
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+class _Entry:
+    def __init__(self, value, size):
+        self.value = value
+        self.size = size
+        self.users = 0
+
+
+# Which Vosk model and which Argos packages belong to each spoken language, and which of them are loaded.
+# By default a language's Vosk model is <models_dir>/vosk-<language>, its optional small model (for load
+# shedding) <models_dir>/vosk-<language>-small and its Argos package for a target
+# <models_dir>/translate-<language>_<target>.argosmodel; register() points a language somewhere else.
+# Models are loaded on first use and kept in an LRU. Once the loaded models add up to more than
+# memory_budget bytes (estimated from their size on disk) the least recently used ones that no engine
+# is holding are unloaded. acquire() holds a Vosk model for a running engine until release().
+class ModelRegistry:
+    def __init__(self, models_dir, memory_budget=None, load_vosk=None, load_translation=None):
+        self.models_dir = models_dir
+        self.memory_budget = memory_budget
+        self.load_vosk = load_vosk
+        self.load_translation = load_translation
+        self.vosk_paths = {}
+        self.small_vosk_paths = {}
+        self.argos_paths = {}
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.loading_locks = {}  # One per model, so a model is only loaded once when asked for twice at once
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        metrics.gauge('translator_model_bytes', "Estimated memory of the loaded models", func=self.loaded_bytes)
+
+    # Use vosk_path as the Vosk model of language, small_vosk_path as its small model
+    # and argos_packages ({target: .argosmodel path}) for its translations
+    def register(self, language, vosk_path=None, argos_packages=None, small_vosk_path=None):
+        language = base_language(language)
+        with self.lock:
+            if vosk_path:
+                self.vosk_paths[language] = vosk_path
+            if small_vosk_path:
+                self.small_vosk_paths[language] = small_vosk_path
+            for target, package_path in (argos_packages or {}).items():
+                self.argos_paths[(language, target)] = package_path
+
+    def vosk_path(self, language, small=False):
+        language = base_language(language)
+        if small:
+            return self.small_vosk_paths.get(language) or os.path.join(self.models_dir, f"vosk-{language}-small")
+        return self.vosk_paths.get(language) or os.path.join(self.models_dir, f"vosk-{language}")
+
+    def has_small_model(self, language):
+        return os.path.isdir(self.vosk_path(language, small=True))
+
+    def argos_package_path(self, from_code, to_code):
+        return (self.argos_paths.get((from_code, to_code))
+                or os.path.join(self.models_dir, f"translate-{from_code}_{to_code}.argosmodel"))
+
+    # Languages with a Vosk model on disk
+    def available_languages(self):
+        languages = {language for language, path in self.vosk_paths.items() if os.path.isdir(path)}
+        if os.path.isdir(self.models_dir):
+            for name in os.listdir(self.models_dir):
+                if (name.startswith('vosk-') and not name.endswith('-small')
+                        and os.path.isdir(os.path.join(self.models_dir, name))):
+                    languages.add(name[len('vosk-'):])
+        return sorted(languages)
+
+    def _vosk_key(self, language, small):
+        return ('vosk', base_language(language)) + (('small',) if small else ())
+
+    def is_loaded(self, language, small=False):
+        with self.lock:
+            return self._vosk_key(language, small) in self.entries
+
+    # The Vosk model of language (or its small model), held until release()
+    def acquire(self, language, small=False):
+        return self._get(self._vosk_key(language, small), hold=True)
+
+    def release(self, language, small=False):
+        with self.lock:
+            entry = self.entries.get(self._vosk_key(language, small))
+            if entry is not None and entry.users:
+                entry.users -= 1
+            self._evict()
+
+    # The Vosk model of language without holding it, e.g. to load it ahead of time
+    def get(self, language):
+        return self._get(self._vosk_key(language, False), hold=False)
+
+    # Argos translation from_code -> to_code. Kept loaded like the Vosk models, so a batch
+    # does not have to look the installed packages up and load the translator again.
+    def get_translation(self, from_code, to_code):
+        return self._get(('argos', from_code, to_code), hold=False)
+
+    def _load(self, key):
+        if key[0] == 'vosk':
+            path = self.vosk_path(key[1], small=len(key) > 2)
+            return self.load_vosk(path), disk_size(path)
+        from_code, to_code = key[1], key[2]
+        package_path = self.argos_package_path(from_code, to_code)
+        if os.path.exists(package_path):
+            size = disk_size(package_path)
+        else:
+            # No direct package, Argos goes through English
+            size = (disk_size(self.argos_package_path(from_code, 'en'))
+                    + disk_size(self.argos_package_path('en', to_code)))
+        return self.load_translation(from_code, to_code), size
+
+    def _get(self, key, hold):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                entry.users += hold
+                return entry.value
+            loading_lock = self.loading_locks.setdefault(key, threading.Lock())
+
+        with loading_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    # Loaded by another thread while this one waited
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    entry.users += hold
+                    return entry.value
+            value, size = self._load(key)
+            with self.lock:
+                entry = self.entries[key] = _Entry(value, size)
+                entry.users += hold
+                self.loads += 1
+                model_loads.inc()
+                logging.info(f"Loaded {' '.join(key)} model ({size / 1048576:.0f} MB), "
+                             f"{self._loaded_bytes() / 1048576:.0f} MB loaded in total")
+                self._evict(keep=key)
+            return value
+
+    def _loaded_bytes(self):
+        return sum(entry.size for entry in self.entries.values())
+
+    def loaded_bytes(self):
+        with self.lock:
+            return self._loaded_bytes()
+
+    # Unload idle models, least recently used first, until the rest fits the budget. Models that are
+    # held, and the one that was just asked for, stay even when they alone are over it.
+    def _evict(self, keep=None):
+        if self.memory_budget is None:
+            return
+        total = self._loaded_bytes()
+        for key, entry in list(self.entries.items()):
+            if total <= self.memory_budget:
+                break
+            if entry.users or key == keep:
+                continue
+            del self.entries[key]
+            total -= entry.size
+            self.evictions += 1
+            model_evictions.inc()
+            logging.info(f"Unloaded idle {' '.join(key)} model ({entry.size / 1048576:.0f} MB)")
+        if total > self.memory_budget:
+            logging.warning(f"Models in use take {total / 1048576:.0f} MB, "
+                            f"over the {self.memory_budget / 1048576:.0f} MB budget")
+
+    def stats(self):
+        with self.lock:
+            return {'loaded': {' '.join(key): {'mb': round(entry.size / 1048576, 1), 'users': entry.users}
+                               for key, entry in self.entries.items()},
+                    'loaded_mb': round(self._loaded_bytes() / 1048576, 1),
+                    'budget_mb': round(self.memory_budget / 1048576, 1) if self.memory_budget else None,
+                    'hits': self.hits, 'loads': self.loads, 'evictions': self.evictions}
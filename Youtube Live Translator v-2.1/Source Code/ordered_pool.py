@@ -0,0 +1,68 @@
+import time
+import logging
+import queue
+import threading
+import concurrent.futures
+
+
+# Runs worker(item) for several items at once but hands the results to on_result strictly in the
+# order the items were submitted. on_result(item, result, error) gets error=None on success, the
+# exception the worker raised, or a TimeoutError if the worker took longer than timeout seconds.
+# A timed out request is skipped (its late result is thrown away) so it cannot hold up the rest.
+class OrderedWorkerPool:
+    def __init__(self, worker, on_result, max_in_flight=4, timeout=30.0, name='ordered-pool'):
+        self.worker = worker
+        self.on_result = on_result
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        # Extra threads so a few requests stuck past their timeout do not starve new ones
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight * 2,
+                                                              thread_name_prefix=name)
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.pending = queue.Queue()
+        self.submitted = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.delivery_thread = threading.Thread(target=self._deliver, name=f"{name}-delivery", daemon=True)
+        self.delivery_thread.start()
+
+    # Number of requests submitted but not yet delivered
+    def in_flight(self):
+        return self.submitted - self.completed
+
+    # Queue an item for the worker. Blocks while max_in_flight requests are outstanding.
+    def submit(self, item):
+        self.slots.acquire()
+        future = self.executor.submit(self.worker, item)
+        self.pending.put((item, future, time.monotonic() + self.timeout))
+        self.submitted += 1
+
+    def _deliver(self):
+        while True:
+            entry = self.pending.get()
+            if entry is None:
+                return
+            item, future, deadline = entry
+            result, error = None, None
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                error = TimeoutError(f"Request took longer than {self.timeout} seconds")
+                self.timed_out += 1
+            except Exception as e:
+                error = e
+                self.failed += 1
+            self.completed += 1
+            self.slots.release()
+            try:
+                self.on_result(item, result, error)
+            except Exception as e:
+                logging.exception(f"Result callback failed: {e}")
+
+    # Deliver everything still outstanding, then stop the worker threads
+    def close(self):
+        self.pending.put(None)
+        self.delivery_thread.join()
+        self.executor.shutdown(wait=False)
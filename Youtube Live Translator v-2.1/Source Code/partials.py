@@ -0,0 +1,47 @@
+from collections import deque
+
+
+# Follows the growing Vosk partial hypothesis of the current utterance and works out which
+# words have stopped changing. Only those newly stabilized words need translating; the rest
+# of the utterance is translated once, when Vosk hands over the final result.
+class PartialTracker:
+    def __init__(self, stable_after=3, min_span_words=3):
+        # A word is stable once it has been in the same place in this many hypotheses in a row
+        self.stable_after = max(1, stable_after)
+        # Stabilized words are batched up until there are at least this many to translate
+        self.min_span_words = max(1, min_span_words)
+        self.reset()
+
+    # Forget the current utterance (called whenever Vosk returns a final result)
+    def reset(self):
+        self.history = deque(maxlen=self.stable_after)
+        self.committed = 0  # Number of leading words already handed out for translation
+        self.last_partial = ''
+
+    # Longest run of leading words that all recent hypotheses agree on
+    def stable_prefix(self):
+        if len(self.history) < self.stable_after:
+            return []
+        prefix = []
+        for words in zip(*self.history):
+            if any(word != words[0] for word in words[1:]):
+                break
+            prefix.append(words[0])
+        return prefix
+
+    # Feed the next partial hypothesis.
+    # Returns (changed, span): changed tells whether the partial text differs from the last one,
+    # span is a newly stabilized piece of text that should be translated now, or None.
+    def update(self, partial):
+        partial = ' '.join(partial.split())
+        changed = partial != self.last_partial
+        self.last_partial = partial
+        self.history.append(partial.split())
+
+        stable = self.stable_prefix()
+        if len(stable) - self.committed < self.min_span_words:
+            return changed, None
+
+        span = ' '.join(stable[self.committed:])
+        self.committed = len(stable)
+        return changed, span
@@ -0,0 +1,127 @@
+import time
+import queue
+import struct
+import threading
+import subprocess
+
+
+# Skip the RIFF/WAVE header of a stream so only PCM samples are left to read.
+# Returns the format chunk as a dict (channels, sample_rate, bits_per_sample).
+def skip_wav_header(stream):
+    riff = _read_exactly(stream, 12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        raise ValueError("Not a WAV stream")
+    wav_format = {}
+    while True:
+        chunk_header = _read_exactly(stream, 8)
+        if len(chunk_header) < 8:
+            raise ValueError("WAV stream has no data chunk")
+        chunk_id, chunk_size = chunk_header[:4], struct.unpack('<I', chunk_header[4:])[0]
+        if chunk_id == b'data':
+            return wav_format
+        body = _read_exactly(stream, chunk_size + (chunk_size & 1))
+        if chunk_id == b'fmt ':
+            _, channels, sample_rate, _, _, bits_per_sample = struct.unpack('<HHIIHH', body[:16])
+            wav_format = {'channels': channels, 'sample_rate': sample_rate, 'bits_per_sample': bits_per_sample}
+
+
+def _read_exactly(stream, size):
+    data = b''
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+# Opens a local audio file as a stream of 16 kHz mono s16le PCM.
+# 16 kHz mono 16-bit WAV and raw .pcm/.raw files are read directly; anything else is decoded by a local ffmpeg.
+# Returns (stream, decoder process or None).
+def open_pcm(path):
+    if path.lower().endswith(('.pcm', '.raw')):
+        return open(path, 'rb', buffering=0), None
+    if path.lower().endswith('.wav'):
+        stream = open(path, 'rb', buffering=0)
+        try:
+            wav_format = skip_wav_header(stream)
+        except ValueError:
+            wav_format = {}
+        if wav_format == {'channels': 1, 'sample_rate': 16000, 'bits_per_sample': 16}:
+            return stream, None
+        stream.close()
+    decoder = subprocess.Popen(['ffmpeg', '-i', path, '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', '16000',
+                                '-ac', '1', 'pipe:1'],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+    return decoder.stdout, decoder
+
+
+# Reads raw PCM from a pipe or file into a fixed ring of preallocated slots with readinto(), and hands
+# out memoryviews of those slots instead of new bytes objects. Every chunk must be given back with
+# release() once its consumer is done; when all slots are in use read() waits for one to come back,
+# which throttles the reader the same way a full queue would. fill_seconds is how long the last read
+# waited on the stream itself, not counting any wait for a free slot.
+class PCMRingReader:
+    def __init__(self, stream, chunk_size=4096, slots=64):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.slots = {}
+        self.free = queue.Queue()
+        for _ in range(slots):
+            buffer = bytearray(chunk_size)
+            self.slots[id(buffer)] = memoryview(buffer)
+            self.free.put(buffer)
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.bytes_read = 0
+        self.bytes_copied = 0
+        self.waits = 0
+        self.fill_seconds = 0.0
+
+    # Next chunk as a memoryview (a full chunk unless the stream is ending), or None at end of stream
+    def read(self, timeout=None):
+        try:
+            buffer = self.free.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                self.waits += 1
+            buffer = self.free.get(timeout=timeout)
+        view = self.slots[id(buffer)]
+
+        started = time.monotonic()
+        filled = 0
+        while filled < self.chunk_size:
+            count = self.stream.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        self.fill_seconds = time.monotonic() - started
+        if not filled:
+            self.free.put(buffer)
+            return None
+
+        with self.lock:
+            self.reads += 1
+            self.bytes_read += filled
+        return view if filled == self.chunk_size else view[:filled]
+
+    # Give a chunk back so its slot can be filled again
+    def release(self, chunk):
+        self.free.put(chunk.obj)
+
+    # Copy a chunk into a bytes object, for consumers that cannot take a buffer (counted in stats)
+    def copy(self, chunk):
+        with self.lock:
+            self.bytes_copied += len(chunk)
+        return bytes(chunk)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'reads': self.reads,
+                'bytes_read': self.bytes_read,
+                'bytes_copied': self.bytes_copied,
+                'preallocated_bytes': self.chunk_size * len(self.slots),
+                'slots_free': self.free.qsize(),
+                'waits_for_slot': self.waits,
+            }
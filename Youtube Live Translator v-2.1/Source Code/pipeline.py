@@ -0,0 +1,266 @@
+import queue
+import threading
+import time
+import logging
+import metrics
+
+# What a stage does when the queue feeding the next stage is full
+BLOCK = 'block'              # wait for room (slows the upstream stage down)
+DROP_OLDEST = 'drop_oldest'  # throw away the oldest queued item to make room
+DROP_NEWEST = 'drop_newest'  # throw away the item that was about to be queued
+
+# Marks the end of the stream as it travels down the pipeline
+_END = object()
+
+stage_errors = metrics.counter('translator_errors_total', "Errors, by where they happened", kind='stage')
+
+
+# One worker thread fed by a bounded input queue.
+# With batch_size > 1 the stage takes whatever is already waiting in its queue (up to batch_size items)
+# and func gets a list of items and returns a list of results. Under load it waits up to batch_wait
+# seconds to fill a batch; a lone item is processed straight away, so batching adds no latency when idle.
+# on_drop(item) is called for every item a drop policy throws away, e.g. to give a buffer back to its pool.
+# func (and finish) may also return a list to pass on several results for one item; None passes on nothing.
+class Stage:
+    def __init__(self, name, func, maxsize=64, backpressure=BLOCK, finish=None, batch_size=1, batch_wait=0.0,
+                 on_drop=None):
+        if backpressure not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.name = name
+        self.func = func
+        self.finish = finish
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.backpressure = backpressure
+        self.on_drop = on_drop
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.cpu_seconds = 0.0  # CPU time of this stage's thread, busy_seconds also counts waiting
+        self.next_stage = None
+        self.thread = None
+
+    # Hand an item to this stage, applying the backpressure policy if it is full
+    def put(self, item, stop_event):
+        if item is _END:
+            # The end marker is never dropped, make room for it if we have to
+            while not stop_event.is_set():
+                try:
+                    self.queue.put(_END, timeout=0.1)
+                    return
+                except queue.Full:
+                    if self.backpressure != BLOCK:
+                        self._discard_oldest()
+            return
+
+        if self.backpressure == BLOCK:
+            while not stop_event.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        elif self.backpressure == DROP_NEWEST:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self._dropped(item)
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    self._discard_oldest()
+
+    def _discard_oldest(self):
+        try:
+            oldest = self.queue.get_nowait()
+        except queue.Empty:
+            return
+        if oldest is _END:
+            # Never lose the end marker, put it back and drop nothing
+            self.queue.put_nowait(oldest)
+            return
+        self._dropped(oldest)
+
+    def _dropped(self, item):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def _emit(self, item, stop_event):
+        if isinstance(item, list):
+            for each in item:
+                self._emit(each, stop_event)
+        elif item is not None and self.next_stage is not None:
+            self.next_stage.put(item, stop_event)
+
+    # Collect more queued items behind the first one, returns (batch, end_of_stream_seen)
+    def _gather(self, first_item):
+        batch = [first_item]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                if self.queue.qsize() or self.batch_wait <= 0 or len(batch) == 1:
+                    # Only wait for stragglers when there was already a backlog
+                    item = self.queue.get_nowait()
+                else:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _finish(self, stop_event):
+        if self.finish is not None:
+            self._emit(self.finish(), stop_event)
+        if self.next_stage is not None:
+            self.next_stage.put(_END, stop_event)
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                item = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if item is _END:
+                self._finish(stop_event)
+                return
+
+            started = time.perf_counter()
+            cpu_started = time.thread_time()
+            if self.batch_size == 1:
+                try:
+                    results = [self.func(item)]
+                except Exception as e:
+                    stage_errors.inc()
+                    logging.exception(f"Pipeline stage '{self.name}' failed: {e}")
+                    results = []
+                processed, end_seen = 1, False
+            else:
+                batch, end_seen = self._gather(item)
+                try:
+                    results = self.func(batch)
+                except Exception as e:
+                    stage_errors.inc()
+                    logging.exception(f"Pipeline stage '{self.name}' failed: {e}")
+                    results = []
+                processed = len(batch)
+            self.busy_seconds += time.perf_counter() - started
+            self.cpu_seconds += time.thread_time() - cpu_started
+            self.processed += processed
+            for result in results:
+                self._emit(result, stop_event)
+
+            if end_seen:
+                self._finish(stop_event)
+                return
+
+
+# A chain of stages that starts with a source function (e.g. reading ffmpeg output).
+# The source returns the next item, or None once the stream has ended.
+class Pipeline:
+    def __init__(self, name='pipeline'):
+        self.name = name
+        self.source_name = None
+        self.source = None
+        self.stages = []
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.source_items = 0
+        self.source_cpu_seconds = 0.0
+
+    def set_source(self, name, read):
+        self.source_name = name
+        self.source = read
+        return self
+
+    def add_stage(self, name, func, maxsize=64, backpressure=BLOCK, finish=None, batch_size=1, batch_wait=0.0,
+                  on_drop=None):
+        stage = Stage(name, func, maxsize=maxsize, backpressure=backpressure, finish=finish,
+                      batch_size=batch_size, batch_wait=batch_wait, on_drop=on_drop)
+        if self.stages:
+            self.stages[-1].next_stage = stage
+        self.stages.append(stage)
+        return stage
+
+    def _run_source(self):
+        first_stage = self.stages[0] if self.stages else None
+        try:
+            while not self.stop_event.is_set():
+                cpu_started = time.thread_time()
+                item = self.source()
+                self.source_cpu_seconds += time.thread_time() - cpu_started
+                if item is None:
+                    break
+                self.source_items += 1
+                if first_stage is not None:
+                    first_stage.put(item, self.stop_event)
+        except Exception as e:
+            logging.exception(f"Pipeline source '{self.source_name}' failed: {e}")
+        finally:
+            if first_stage is not None:
+                first_stage.put(_END, self.stop_event)
+
+    def start(self):
+        if self.source is None:
+            raise RuntimeError("Pipeline has no source")
+        for stage in self.stages:
+            thread = threading.Thread(target=stage.run, args=(self.stop_event,),
+                                      name=f"{self.name}-{stage.name}", daemon=True)
+            stage.thread = thread
+            self.threads.append(thread)
+            thread.start()
+        source_thread = threading.Thread(target=self._run_source, name=f"{self.name}-{self.source_name}",
+                                         daemon=True)
+        self.threads.append(source_thread)
+        source_thread.start()
+        return self
+
+    # Ask every stage to stop without draining what is still queued
+    def stop(self):
+        self.stop_event.set()
+
+    # Wait until every stage has finished (end of stream or stop())
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    # Current queue depth in front of every stage, in pipeline order
+    def depths(self):
+        return {stage.name: stage.depth() for stage in self.stages}
+
+    # Per-stage counters, useful to tell which stage is the bottleneck
+    def stats(self):
+        return {
+            stage.name: {
+                'depth': stage.depth(),
+                'capacity': stage.queue.maxsize,
+                'processed': stage.processed,
+                'dropped': stage.dropped,
+                'busy_seconds': round(stage.busy_seconds, 3),
+                'cpu_seconds': round(stage.cpu_seconds, 3),
+            }
+            for stage in self.stages
+        }
+
+    def source_stats(self):
+        return {'name': self.source_name, 'items': self.source_items,
+                'cpu_seconds': round(self.source_cpu_seconds, 3)}
+
+    # Short one-line summary, e.g. "recognize 3/64 | translate 0/16 | sink 0/64"
+    def report(self):
+        return " | ".join(f"{stage.name} {stage.depth()}/{stage.queue.maxsize}" for stage in self.stages)
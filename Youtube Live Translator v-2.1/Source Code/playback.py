@@ -0,0 +1,184 @@
+import queue
+import threading
+import wave
+import logging
+
+
+# Output sinks take 16-bit mono PCM through write(pcm) and are closed with close().
+# write() may block for as long as the audio takes to play; it is only ever called from the player thread.
+
+# Discards the audio, for headless runs and tests
+class NullSink:
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, pcm):
+        self.bytes_written += len(pcm)
+
+    def close(self):
+        pass
+
+
+# Writes the audio to a WAV file instead of the speakers
+class WaveFileSink:
+    def __init__(self, path, sample_rate=16000):
+        self.wav_file = wave.open(path, 'wb')
+        self.wav_file.setnchannels(1)
+        self.wav_file.setsampwidth(2)
+        self.wav_file.setframerate(sample_rate)
+
+    def write(self, pcm):
+        self.wav_file.writeframes(pcm)
+
+    def close(self):
+        self.wav_file.close()
+
+
+# Streams to the sound card through PyAudio. The device is opened on the first write, so creating
+# the sink costs nothing when playback is never switched on.
+class PyAudioSink:
+    def __init__(self, sample_rate=16000):
+        import pyaudio
+        self.pyaudio = pyaudio
+        self.sample_rate = sample_rate
+        self.audio = None
+        self.stream = None
+
+    def write(self, pcm):
+        if self.stream is None:
+            self.audio = self.pyaudio.PyAudio()
+            self.stream = self.audio.open(format=self.pyaudio.paInt16, channels=1, rate=self.sample_rate, output=True)
+        self.stream.write(bytes(pcm))
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.audio.terminate()
+            self.stream = None
+
+
+# Plays through pydub when PyAudio is not installed. pydub plays one clip at a time, so the audio is
+# collected into block_seconds long clips to keep the gaps between them rare.
+class PydubSink:
+    def __init__(self, sample_rate=16000, block_seconds=1.0):
+        from pydub import AudioSegment
+        from pydub.playback import play
+        self.audio_segment = AudioSegment
+        self.play = play
+        self.sample_rate = sample_rate
+        self.block_bytes = int(sample_rate * block_seconds) * 2
+        self.pending = bytearray()
+
+    def write(self, pcm):
+        self.pending += pcm
+        if len(self.pending) >= self.block_bytes:
+            self._play_pending()
+
+    def _play_pending(self):
+        clip = self.audio_segment(data=bytes(self.pending), sample_width=2, frame_rate=self.sample_rate, channels=1)
+        self.pending = bytearray()
+        self.play(clip)
+
+    def close(self):
+        if self.pending:
+            self._play_pending()
+
+
+# Best sink available for the speakers: PyAudio, then pydub, else nothing
+def default_sink(sample_rate=16000):
+    try:
+        return PyAudioSink(sample_rate)
+    except ImportError:
+        pass
+    try:
+        return PydubSink(sample_rate)
+    except ImportError:
+        logging.warning("Neither PyAudio nor pydub is installed, audio playback is disabled")
+        return NullSink()
+
+
+# Plays the stream on its own thread so playback never holds up recognition.
+# feed() copies the chunk into a bounded queue and returns at once. If the sink falls more than
+# max_buffer_seconds behind, the oldest audio is thrown away so playback catches up with the stream.
+# Without a sink the default one is created on the first feed(), so a player that never plays opens no device.
+class AudioPlayer:
+    def __init__(self, sink=None, sample_rate=16000, max_buffer_seconds=5.0, chunk_seconds=0.25):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        max_chunks = max(1, int(max_buffer_seconds / chunk_seconds))
+        self.queue = queue.Queue(maxsize=max_chunks)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.closed = False
+        self.played_bytes = 0
+        self.dropped_bytes = 0
+
+    def _start(self):
+        if self.sink is None:
+            self.sink = default_sink(self.sample_rate)
+        self.thread = threading.Thread(target=self._run, name='audio-player', daemon=True)
+        self.thread.start()
+
+    # Queue a chunk for playback (bytes or memoryview, copied so the caller can reuse its buffer)
+    def feed(self, pcm):
+        with self.lock:
+            if self.closed:
+                return
+            if self.thread is None:
+                self._start()
+            chunk = bytes(pcm)
+            while True:
+                try:
+                    self.queue.put_nowait(chunk)
+                    return
+                except queue.Full:
+                    try:
+                        self.dropped_bytes += len(self.queue.get_nowait())
+                    except queue.Empty:
+                        pass
+
+    def _run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            try:
+                self.sink.write(chunk)
+                self.played_bytes += len(chunk)
+            except Exception as e:
+                logging.error(f"Audio playback failed: {e}")
+        try:
+            self.sink.close()
+        except Exception as e:
+            logging.error(f"Could not close audio output: {e}")
+
+    # Seconds of audio waiting to be played
+    def buffered_seconds(self):
+        with self.queue.mutex:
+            queued_bytes = sum(len(chunk) for chunk in self.queue.queue if chunk is not None)
+        return queued_bytes / (self.sample_rate * 2)
+
+    def stats(self):
+        return {
+            'played_seconds': round(self.played_bytes / (self.sample_rate * 2), 2),
+            'dropped_seconds': round(self.dropped_bytes / (self.sample_rate * 2), 2),
+            'buffered_seconds': round(self.buffered_seconds(), 2),
+        }
+
+    # Stop playing and close the sink, whatever is still queued is not played
+    def close(self, timeout=2):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self.thread
+            if thread is None:
+                return
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put(None)
+        thread.join(timeout)
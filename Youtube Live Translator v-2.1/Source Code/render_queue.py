@@ -0,0 +1,94 @@
+import threading
+import tkinter as tk
+import metrics
+
+render_seconds = metrics.histogram('translator_stage_seconds', "Seconds spent per call in each hot-path step",
+                                   stage='render')
+
+
+# Thread-safe front end for a transcript ScrolledText.
+# Worker threads only queue updates; the Tk thread drains them with root.after at most max_fps times
+# a second and applies everything that piled up in a single insert. Only the newest live line and
+# status text of a frame are drawn, and the widget is trimmed to max_lines so it never grows forever.
+class TranscriptRenderer:
+    def __init__(self, root, text_widget, status_label=None, max_fps=10, max_lines=2000):
+        self.root = root
+        self.text_widget = text_widget
+        self.status_label = status_label
+        self.interval = max(1, int(1000 / max_fps))
+        self.max_lines = max_lines
+        self.lock = threading.Lock()
+        self.appended = []
+        self.live_text = None  # None: leave the live line alone, '': remove it
+        self.status_text = None
+        self.running = False
+        self.frames = 0
+        self.updates = 0
+
+    # Add finished text at the end of the transcript (also removes the live line)
+    def append(self, text):
+        with self.lock:
+            self.appended.append(text)
+            self.live_text = ''
+            self.updates += 1
+
+    # Replace the line showing the utterance in progress
+    def set_live(self, text):
+        with self.lock:
+            self.live_text = text
+            self.updates += 1
+
+    def set_status(self, text):
+        with self.lock:
+            self.status_text = text
+            self.updates += 1
+
+    # Start draining on the Tk thread, call this from the Tk thread
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.root.after(self.interval, self._drain)
+
+    def stop(self):
+        self.running = False
+
+    def _drain(self):
+        if not self.running:
+            return
+        with self.lock:
+            appended, self.appended = self.appended, []
+            live_text, self.live_text = self.live_text, None
+            status_text, self.status_text = self.status_text, None
+
+        try:
+            if status_text is not None and self.status_label is not None:
+                self.status_label.config(text=status_text)
+            if appended or live_text is not None:
+                with render_seconds.time():
+                    self._render(''.join(appended), live_text)
+                self.frames += 1
+        except tk.TclError:
+            # The window is being destroyed
+            self.running = False
+            return
+        self.root.after(self.interval, self._drain)
+
+    def _render(self, appended_text, live_text):
+        widget = self.text_widget
+        widget.config(state=tk.NORMAL)
+        live_range = widget.tag_ranges('live')
+        if live_range and live_text is not None:
+            widget.delete(live_range[0], live_range[-1])
+            live_range = ()
+        if appended_text:
+            # Finished text always goes above the live line
+            widget.insert(live_range[0] if live_range else tk.END, appended_text)
+        if live_text:
+            widget.insert(tk.END, live_text, 'live')
+
+        # Drop the oldest lines once the scrollback limit is reached
+        line_count = int(widget.index('end-1c').split('.')[0])
+        if self.max_lines and line_count > self.max_lines:
+            widget.delete('1.0', f"{line_count - self.max_lines + 1}.0")
+        widget.config(state=tk.DISABLED)
+        widget.yview(tk.END)
@@ -0,0 +1,97 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+
+# Records how long each startup phase took, e.g. imports, window, Argos install, Vosk model
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = OrderedDict()
+        self.notes = {}
+        self.lock = threading.Lock()
+
+    # Close the phase that ran since the previous mark (used for phases on the main thread)
+    def mark(self, name, note=None):
+        with self.lock:
+            now = time.perf_counter()
+            self.phases[name] = now - self.last
+            self.last = now
+            if note:
+                self.notes[name] = note
+
+    # Record a phase that was timed separately (used for phases on the loader thread)
+    def record(self, name, seconds, note=None):
+        with self.lock:
+            self.phases[name] = seconds
+            if note:
+                self.notes[name] = note
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        with self.lock:
+            timings = {name: round(seconds, 3) for name, seconds in self.phases.items()}
+        timings['total'] = round(self.total(), 3)
+        return timings
+
+    # e.g. "imports 0.41s, window 0.06s, argos install 0.00s (already installed), total 2.87s"
+    def report(self):
+        with self.lock:
+            parts = [
+                f"{name.replace('_', ' ')} {seconds:.2f}s" + (f" ({self.notes[name]})" if name in self.notes else '')
+                for name, seconds in self.phases.items()
+            ]
+        parts.append(f"total {self.total():.2f}s")
+        return ", ".join(parts)
+
+
+# Runs slow startup steps (installing and loading models) on a background thread so the window
+# or command line is usable straight away. steps is a list of (name, func); a func may return a
+# string such as "already installed" that ends up in the timing report, other return values are ignored.
+# on_progress(done, total, name) is called before each step and once more with name None at the end.
+class BackgroundLoader:
+    def __init__(self, steps, timer=None, on_progress=None):
+        self.steps = steps
+        self.timer = timer or StartupTimer()
+        self.on_progress = on_progress
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='model-loader', daemon=True)
+        self.thread.start()
+        return self
+
+    def _progress(self, done, name):
+        if self.on_progress is not None:
+            try:
+                self.on_progress(done, len(self.steps), name)
+            except Exception as e:
+                logging.exception(f"Startup progress callback failed: {e}")
+
+    def _run(self):
+        try:
+            for done, (name, func) in enumerate(self.steps):
+                self._progress(done, name)
+                started = time.perf_counter()
+                note = func()
+                self.timer.record(name, time.perf_counter() - started, note if isinstance(note, str) else None)
+        except Exception as e:
+            logging.exception(f"Startup step failed: {e}")
+            self.error = e
+        finally:
+            self.ready.set()
+            self._progress(len(self.steps), None)
+            logging.info(f"Startup timings: {self.timer.report()}")
+
+    # Block until every step has run; raises the first error a step raised
+    def wait(self, timeout=None):
+        self.ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.ready.is_set()
@@ -0,0 +1,111 @@
+import re
+import time
+import threading
+import logging
+from urllib.parse import urlparse, parse_qs
+import yt_dlp
+
+# Options used for every extraction
+YDL_OPTS = {
+    'format': 'bestaudio/best',
+    'quiet': True,
+    'no_warnings': True,
+    'force_generic_extractor': True,
+}
+
+
+# Bitrate of a format in kbit/s, or None if yt-dlp does not know it
+def format_bitrate(f):
+    return f.get('abr') or f.get('tbr')
+
+
+def has_audio(f):
+    return f.get('acodec') not in (None, 'none')
+
+
+def is_audio_only(f):
+    return has_audio(f) and f.get('vcodec') == 'none'
+
+
+# Pick the cheapest format that still sounds good enough:
+# the lowest-bitrate audio-only format at or above min_bitrate (kbit/s), else the best audio-only
+# format below it, else (no audio-only formats, common on live streams) the lowest-bitrate muxed format.
+def select_audio_format(formats, min_bitrate=48):
+    audio_only = [f for f in formats if is_audio_only(f) and f.get('url')]
+    if audio_only:
+        good_enough = [f for f in audio_only if (format_bitrate(f) or 0) >= min_bitrate]
+        if good_enough:
+            return min(good_enough, key=format_bitrate)
+        return max(audio_only, key=lambda f: format_bitrate(f) or 0)
+
+    with_audio = [f for f in formats if has_audio(f) and f.get('url')]
+    if not with_audio:
+        return None
+    # Unknown bitrates sort last so a known-small format wins
+    return min(with_audio, key=lambda f: format_bitrate(f) or float('inf'))
+
+
+# When a signed googlevideo URL stops working, from its "expire" query or path parameter
+def url_expiry(url):
+    query = parse_qs(urlparse(url).query)
+    if 'expire' in query:
+        try:
+            return float(query['expire'][0])
+        except ValueError:
+            return None
+    match = re.search(r'/expire/(\d+)', url)
+    return float(match.group(1)) if match else None
+
+
+# Resolves a YouTube page URL to a direct audio URL and remembers the answer until shortly before
+# the signed URL expires, so reconnects skip the full yt-dlp extraction.
+class StreamResolver:
+    def __init__(self, min_audio_bitrate=48, expiry_margin=60, default_ttl=1800, extract_info=None):
+        self.min_audio_bitrate = min_audio_bitrate
+        self.expiry_margin = expiry_margin
+        self.default_ttl = default_ttl
+        self.extract_info = extract_info or self._extract_with_yt_dlp
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.extractions = 0
+
+    def _extract_with_yt_dlp(self, youtube_url):
+        with yt_dlp.YoutubeDL(YDL_OPTS) as ydl:
+            return ydl.extract_info(youtube_url, download=False)
+
+    # Direct audio URL for youtube_url; refresh=True forces a new extraction
+    def resolve(self, youtube_url, refresh=False):
+        now = time.time()
+        with self.lock:
+            cached = self.cache.get(youtube_url)
+            if cached and not refresh and cached['valid_until'] > now:
+                self.hits += 1
+                return cached['url']
+
+        started = time.perf_counter()
+        info_dict = self.extract_info(youtube_url)
+        formats = info_dict.get('formats') or [info_dict]
+        chosen = select_audio_format(formats, self.min_audio_bitrate)
+        if chosen is None:
+            raise RuntimeError(f"No audio format found for {youtube_url}")
+
+        expires = url_expiry(chosen['url'])
+        valid_until = (expires - self.expiry_margin) if expires else now + self.default_ttl
+        with self.lock:
+            self.extractions += 1
+            self.cache[youtube_url] = {'url': chosen['url'], 'valid_until': valid_until,
+                                       'format_id': chosen.get('format_id')}
+        logging.info(f"Resolved {youtube_url} to format {chosen.get('format_id')} "
+                     f"({format_bitrate(chosen)} kbit/s, acodec {chosen.get('acodec')}, vcodec {chosen.get('vcodec')}) "
+                     f"in {time.perf_counter() - started:.2f}s")
+        return chosen['url']
+
+    # Forget a cached URL, e.g. after ffmpeg could not open it
+    def invalidate(self, youtube_url):
+        with self.lock:
+            self.cache.pop(youtube_url, None)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'extractions': self.extractions, 'cached': len(self.cache)}
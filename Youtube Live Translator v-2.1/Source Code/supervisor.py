@@ -0,0 +1,237 @@
+import time
+import random
+import threading
+import logging
+import queue
+import metrics
+from pcm_reader import PCMRingReader
+
+capture_errors = metrics.counter('translator_errors_total', "Errors, by where they happened", kind='capture')
+
+BYTES_PER_SECOND = 16000 * 2  # 16 kHz, 16-bit mono, what ffmpeg is asked for
+
+
+# Owns the ffmpeg capture process and is the only thing that starts, restarts or kills it.
+# start_process(refresh) starts a new process (anything with stdout, stderr, poll, terminate, wait and kill)
+# and may raise, e.g. when the stream URL cannot be resolved; refresh asks for a freshly extracted URL.
+# read() hands out PCM chunks from the current process. When the stream ends or the process dies, read()
+# reaps the old process and starts a new one on the same thread, waiting with exponential backoff and
+# jitter between attempts, so there is never more than one ffmpeg and nobody reads from a dead one.
+# Outages (from noticing the failure to the first audio after it) and the audio lost to them
+# (from the last chunk before to the first chunk after) are recorded in stats(), and every such gap
+# in audio_gaps as (seconds of audio received before it, seconds lost).
+# lag_seconds() says how far behind the live stream a position in the received audio is. It is measured
+# against the clock from when the stream was last known to be live: at the first chunk of every connection,
+# and whenever ffmpeg had nothing to hand out (a read waited longer than the audio it got), the newest
+# audio received is as live as it gets, so stalls and reconnects are never counted as backlog.
+class CaptureSupervisor:
+    def __init__(self, start_process, chunk_size=4096, slots=64, max_retries=5, base_delay=1.0, max_delay=30.0,
+                 jitter=0.5, on_status=None, stop_event=None, random_func=random.random):
+        self.start_process = start_process
+        self.reader = PCMRingReader(None, chunk_size=chunk_size, slots=slots)
+        self.max_retries = max_retries  # Failed attempts in a row before giving up, None to retry forever
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.on_status = on_status
+        self.stop_event = stop_event or threading.Event()
+        self.random_func = random_func
+        self.process = None
+        self.audio_process = None  # Last process that delivered audio
+        self.process_lock = threading.Lock()
+        self.failures = 0
+        self.gave_up = False
+        self.connection = 0  # Goes up by one for every process that delivered audio
+        self.last_audio_time = None
+        self.outage_started = None
+        self.restarts = 0
+        self.outages = []
+        self.lost_audio_seconds = 0.0
+        self.audio_gaps = []
+        self.received_seconds = 0.0
+        self.live_since = None  # When the stream was at received audio second 0, moved forward over stalls
+
+    def _status(self, text):
+        logging.info(text)
+        if self.on_status is not None:
+            self.on_status(text)
+
+    # Delay before the next attempt: base_delay doubled per failure, capped at max_delay, with up to
+    # jitter of it taken off at random so several streams do not hammer YouTube in step
+    def backoff_delay(self, failures):
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, failures - 1)))
+        return delay * (1 - self.jitter * self.random_func())
+
+    # Start the first process. Failing here is not fatal, the first read() counts it and retries
+    def start(self):
+        self._spawn(refresh=False)
+        return self
+
+    def _spawn(self, refresh):
+        try:
+            process = self.start_process(refresh)
+        except Exception as e:
+            logging.error(f"Could not start capture: {e}")
+            return False
+        with self.process_lock:
+            if self.stop_event.is_set():
+                self._retire(process)
+                return False
+            self.process = process
+            self.reader.stream = process.stdout
+        if getattr(process, 'stderr', None) is not None:
+            threading.Thread(target=self._log_errors, args=(process,), name='capture-stderr', daemon=True).start()
+        return True
+
+    # Logs ffmpeg errors. An I/O error ends the process, the reading thread notices and does the restart.
+    def _log_errors(self, process):
+        for line in iter(process.stderr.readline, b''):
+            error = line.decode(errors='replace').strip()
+            if "error" in error.lower():  # Only log actual errors
+                logging.warning(f"ffmpeg error: {error}")
+            if "I/O error" in error:
+                logging.warning("ffmpeg encountered an I/O error, restarting it")
+                process.terminate()
+
+    # Terminate a process and wait for it so it does not linger as a zombie.
+    # Its pipes are only closed from the reading thread, never under a read in progress.
+    def _retire(self, process, close_pipes=True):
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=2)
+                except Exception:
+                    process.kill()
+                    process.wait(timeout=2)
+        except Exception as e:
+            logging.error(f"Could not stop ffmpeg: {e}")
+        if not close_pipes:
+            return
+        for pipe in (getattr(process, 'stdout', None), getattr(process, 'stderr', None)):
+            try:
+                if pipe is not None:
+                    pipe.close()
+            except Exception:
+                pass
+
+    def _failed(self, reason):
+        capture_errors.inc()
+        self.failures += 1
+        if self.outage_started is None:
+            self.outage_started = time.monotonic()
+        if self.max_retries is not None and self.failures > self.max_retries:
+            self.gave_up = True
+            self._status(f"Error - {reason.lower()}, stopped after {self.max_retries} retries.")
+
+    # Replace a dead process, returns False once stopped or out of retries
+    def _reconnect(self, reason):
+        with self.process_lock:
+            process, self.process = self.process, None
+            self.reader.stream = None
+        self._retire(process)
+        self._failed(reason)
+
+        while not self.stop_event.is_set() and not self.gave_up:
+            delay = self.backoff_delay(self.failures)
+            retries = f"{self.failures}/{self.max_retries}" if self.max_retries is not None else f"{self.failures}"
+            self._status(f"{reason}, reconnecting in {delay:.1f}s (retry {retries})...")
+            if self.stop_event.wait(delay):
+                break
+            # The first retry reuses the cached stream URL, later ones extract it again
+            if self._spawn(refresh=self.failures > 1):
+                self.restarts += 1
+                return True
+            self._failed("Could not restart the stream")
+        return False
+
+    # Called for the first chunk a new process delivers
+    def _connected(self):
+        now = time.monotonic()
+        if self.outage_started is not None:
+            self.outages.append(now - self.outage_started)
+            self.outage_started = None
+        if self.last_audio_time is not None:
+            lost = now - self.last_audio_time
+            self.lost_audio_seconds += lost
+            self.audio_gaps.append((self.received_seconds, lost))
+        self.failures = 0
+        self.connection += 1
+
+    # Next chunk of PCM as a memoryview (give it back with release()), or None once stopped or given up
+    def read(self):
+        while not self.stop_event.is_set() and not self.gave_up:
+            with self.process_lock:
+                process = self.process
+            if process is None:
+                if not self._reconnect("Stream unavailable"):
+                    break
+                continue
+            try:
+                chunk = self.reader.read(timeout=0.5)
+            except queue.Empty:
+                continue  # Every slot is still in use downstream, check for stop and wait again
+            except (OSError, ValueError) as e:
+                chunk = None  # The pipe was closed under us
+                logging.debug("Capture read failed: %s", e)
+            if chunk is None:
+                if self.stop_event.is_set():
+                    break
+                if not self._reconnect("Stream interrupted"):
+                    break
+                continue
+            seconds = len(chunk) / BYTES_PER_SECOND
+            live = self.reader.fill_seconds > seconds
+            if process is not self.audio_process:
+                self.audio_process = process
+                self._connected()
+                live = True
+            self.received_seconds += seconds
+            self.last_audio_time = now = time.monotonic()
+            if live and (self.live_since is None or now - self.received_seconds > self.live_since):
+                self.live_since = now - self.received_seconds
+            return chunk
+        return None
+
+    # Seconds between the live stream and position seconds of the audio received so far (gaps left out)
+    def lag_seconds(self, seconds):
+        if self.live_since is None:
+            return 0.0
+        return time.monotonic() - self.live_since - seconds
+
+    def release(self, chunk):
+        self.reader.release(chunk)
+
+    # Stop capturing; a read() in progress returns None.
+    # ffmpeg is told to terminate right away, but it can take seconds to exit, so unless wait is set
+    # it is reaped (and killed if need be) on a background thread and stop() returns straight away;
+    # it is called from the Tk thread.
+    def stop(self, wait=False):
+        self.stop_event.set()
+        with self.process_lock:
+            process, self.process = self.process, None
+        if process is None:
+            return
+        if wait:
+            self._retire(process, close_pipes=False)
+            return
+        try:
+            if process.poll() is None:
+                process.terminate()
+        except Exception as e:
+            logging.error(f"Could not stop ffmpeg: {e}")
+        threading.Thread(target=self._retire, args=(process, False), name='capture-reaper', daemon=True).start()
+
+    def stats(self):
+        return {
+            'connected': self.process is not None,
+            'restarts': self.restarts,
+            'failures_in_a_row': self.failures,
+            'outages': len(self.outages),
+            'outage_seconds': round(sum(self.outages), 2),
+            'longest_outage_seconds': round(max(self.outages, default=0.0), 2),
+            'lost_audio_seconds': round(self.lost_audio_seconds, 2),
+            'bytes_read': self.reader.bytes_read,
+        }
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import threading
+import logging
+import metrics
+
+TRANSCRIPT_FORMATS = ('jsonl', 'srt', 'vtt')
+CAPTION_TEXTS = ('both', 'translated', 'recognized')
+
+transcript_entries = metrics.counter('translator_transcript_entries_total', "Final results written to transcript files")
+transcript_write_seconds = metrics.histogram('translator_stage_seconds', "Seconds spent per call in each hot-path step",
+                                             stage='transcript_write')
+
+
+# Format implied by a file name, jsonl when the extension is not a caption format
+def format_for_path(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'webvtt':
+        return 'vtt'
+    return extension if extension in TRANSCRIPT_FORMATS else 'jsonl'
+
+
+# HH:MM:SS,mmm for SRT, HH:MM:SS.mmm for WebVTT
+def format_timestamp(seconds, separator='.'):
+    milliseconds = int(round(max(seconds, 0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+# TranscriptWriter settings from the command line's flush interval and rotation limits
+def writer_options(flush_interval=5.0, rotate_mb=None, rotate_hours=None):
+    return {
+        'flush_interval': flush_interval,
+        'rotate_bytes': int(rotate_mb * 1024 * 1024) if rotate_mb else None,
+        'rotate_seconds': rotate_hours * 3600 if rotate_hours else None,
+    }
+
+
+# Appends every final result to a JSONL, SRT or WebVTT file, with its start and end in stream seconds.
+# write() only queues the entry; a background thread formats what was queued and writes it with
+# one write and flush every flush_interval seconds, so a busy stream costs one syscall per interval
+# and not one per line. close() writes whatever is still queued.
+# The file is rotated once it is over rotate_bytes or older than rotate_seconds: it is renamed to
+# <name>-<YYYYmmdd-HHMMSS>.<ext> and a fresh file is started under the original name.
+# Stream times start over at 0 with every session, so an SRT or WebVTT file left by an earlier session
+# is moved aside the same way instead of appended to, and its cues never go backwards. JSONL is appended to.
+class TranscriptWriter:
+    def __init__(self, path, format=None, flush_interval=5.0, rotate_bytes=None, rotate_seconds=None,
+                 caption_text='both'):
+        self.format = format or format_for_path(path)
+        if self.format not in TRANSCRIPT_FORMATS:
+            raise ValueError(f"Unknown transcript format {self.format}, expected one of {', '.join(TRANSCRIPT_FORMATS)}")
+        if caption_text not in CAPTION_TEXTS:
+            raise ValueError(f"Unknown caption text {caption_text}, expected one of {', '.join(CAPTION_TEXTS)}")
+        self.path = path
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.caption_text = caption_text
+        self.pending = []
+        self.lock = threading.Lock()  # Guards pending, held only to append or swap the list
+        self.file_lock = threading.Lock()  # Guards the file, held while formatting and writing
+        self.stop_event = threading.Event()
+        self.last_end = 0.0  # End of the previous entry, the start of one without word timings
+        self.written = 0
+        self.rotations = 0
+        if self.format != 'jsonl' and os.path.exists(path) and os.path.getsize(path):
+            logging.info(f"Moved the captions of the previous session to {self._move_aside()}")
+        self._open()
+        self.thread = threading.Thread(target=self._run, name='transcript-writer', daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+        self.opened_at = time.monotonic()
+        self.cue_number = 0
+        self.header_size = 0
+        if self.format == 'vtt' and not self.size:
+            self._write_text("WEBVTT\n\n")
+            self.header_size = self.size
+
+    def _write_text(self, text):
+        data = text.encode('utf-8')
+        self.file.write(text)
+        self.file.flush()
+        self.size += len(data)
+
+    # Queue a result; anything but a final result with recognized text is ignored
+    def write(self, event):
+        if event.get('type') != 'final' or not event.get('recognized'):
+            return
+        with self.lock:
+            self.pending.append(event)
+
+    def _entry(self, event):
+        end = event.get('end', self.last_end)
+        start = min(event.get('start', self.last_end), end)
+        self.last_end = end
+        return start, end
+
+    def _format(self, event):
+        start, end = self._entry(event)
+        if self.format == 'jsonl':
+            entry = {'start': round(start, 3), 'end': round(end, 3), 'recognized': event['recognized'],
+                     'translated': event.get('translated', ''), 'time': event.get('time')}
+            if len(event.get('translations', {})) > 1:
+                entry['translations'] = event['translations']
+            if 'stream' in event:
+                entry['stream'] = event['stream']
+            return json.dumps(entry, ensure_ascii=False) + '\n'
+        lines = []
+        if self.caption_text in ('both', 'recognized'):
+            lines.append(event['recognized'])
+        if self.caption_text in ('both', 'translated'):
+            translations = event.get('translations', {})
+            if len(translations) > 1:
+                # One line per target language, tagged with its code
+                lines.extend(f"[{language}] {text}" for language, text in translations.items() if text)
+            elif event.get('translated'):
+                lines.append(event['translated'])
+        # A blank line would end the cue early
+        text = '\n'.join(' '.join(line.split()) for line in lines if line.strip())
+        if self.format == 'srt':
+            self.cue_number += 1
+            return f"{self.cue_number}\n{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n{text}\n\n"
+        return f"{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+
+    def _should_rotate(self):
+        if self.size <= self.header_size:
+            return False  # Nothing written to it yet
+        if self.rotate_bytes and self.size >= self.rotate_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.monotonic() - self.opened_at >= self.rotate_seconds
+
+    # Rename the file to <name>-<YYYYmmdd-HHMMSS>.<ext>, returns the new name
+    def _move_aside(self):
+        base, extension = os.path.splitext(self.path)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        rotated_path = f"{base}-{stamp}{extension}"
+        suffix = 1
+        while os.path.exists(rotated_path):
+            suffix += 1
+            rotated_path = f"{base}-{stamp}-{suffix}{extension}"
+        os.replace(self.path, rotated_path)
+        return rotated_path
+
+    def _rotate(self):
+        self.file.close()
+        rotated_path = self._move_aside()
+        self.rotations += 1
+        logging.info(f"Rotated transcript {self.path} to {rotated_path}")
+        self._open()
+
+    # Write everything queued so far with a single write
+    def flush(self):
+        with self.lock:
+            events, self.pending = self.pending, []
+        with self.file_lock:
+            if self.file.closed:
+                return
+            try:
+                if self._should_rotate():
+                    self._rotate()
+                if not events:
+                    return
+                with transcript_write_seconds.time():
+                    self._write_text(''.join(self._format(event) for event in events))
+                self.written += len(events)
+                transcript_entries.inc(len(events))
+            except OSError as e:
+                logging.error(f"Could not write {len(events)} transcript entries to {self.path}: {e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return {'path': self.path, 'format': self.format, 'written': self.written, 'pending': pending,
+                'bytes': self.size, 'rotations': self.rotations}
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(self.flush_interval + 1)
+        self.flush()
+        with self.file_lock:
+            self.file.close()
+
+
+# One TranscriptWriter per stream of the daemon, as <directory>/stream-<id>.<format>,
+# created when a stream's first result comes in
+class TranscriptRouter:
+    def __init__(self, directory, format='jsonl', **writer_options):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.writer_options = writer_options
+        self.writers = {}
+        self.lock = threading.Lock()
+
+    def write(self, event):
+        if event.get('type') != 'final':
+            return
+        stream = event.get('stream')
+        with self.lock:
+            writer = self.writers.get(stream)
+            if writer is None:
+                path = os.path.join(self.directory, f"stream-{stream}.{self.format}")
+                writer = self.writers[stream] = TranscriptWriter(path, self.format, **self.writer_options)
+        writer.write(event)
+
+    def close(self):
+        with self.lock:
+            writers, self.writers = list(self.writers.values()), {}
+        for writer in writers:
+            writer.close()
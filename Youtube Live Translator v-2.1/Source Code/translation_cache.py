@@ -0,0 +1,228 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+
+# Normalize whitespace so the same phrase with different spacing shares one cache entry.
+# Case is kept: "US" and "us" are different words to the translator.
+def normalize_text(text):
+    return ' '.join(text.split())
+
+
+# Memo cache in front of a translator, keyed by (source language, target language, normalized text).
+# Recent entries live in an in-memory LRU; if db_path is given they are also kept in SQLite
+# so warm entries survive a restart. New entries and last-used times are written to SQLite by a
+# background thread every flush_interval seconds in one transaction, so translating never waits on the disk.
+# The file is only opened (and the thread started) on first use, so creating a cache, e.g. when a
+# module that has one is imported, touches neither the disk nor any threads.
+class TranslationCache:
+    def __init__(self, max_entries=4096, db_path=None, max_disk_entries=200000, flush_interval=2.0):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.flush_interval = flush_interval
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.miss_seconds = 0.0  # Time spent in the real translator on cache misses
+        self.db = None
+        self.db_lock = threading.Lock()  # Guards the connection; self.lock only guards the dicts
+        self.pending_writes = {}  # key -> translation not yet written to disk
+        self.pending_touches = {}  # key -> last used time not yet written to disk
+        self.disk_writes = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.db_path = db_path  # Opened by _ensure_db(), None once opened or closed
+
+    # Called with self.lock held
+    def _ensure_db(self):
+        if not self.db_path:
+            return
+        db_path, self.db_path = self.db_path, None
+        self._open_db(db_path)
+        if self.db is not None:
+            self.thread = threading.Thread(target=self._run, name='translation-cache-writer', daemon=True)
+            self.thread.start()
+
+    def _open_db(self, db_path):
+        try:
+            directory = os.path.dirname(db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL,"
+                " translation TEXT NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (source, target, text))"
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Translation cache disabled on-disk storage: {e}")
+            self.db = None
+
+    def _key(self, source, target, text):
+        return (source, target, normalize_text(text))
+
+    def _remember(self, key, translation):
+        self.entries[key] = translation
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # Called with self.lock held
+    def _load_from_disk(self, key):
+        self._ensure_db()
+        if self.db is None:
+            return None
+        if key in self.pending_writes:
+            return self.pending_writes[key]
+        try:
+            with self.db_lock:
+                row = self.db.execute(
+                    "SELECT translation FROM translations WHERE source = ? AND target = ? AND text = ?", key
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Translation cache read error: {e}")
+            return None
+        if row is None:
+            return None
+        self.pending_touches[key] = time.time()
+        return row[0]
+
+    # Called with self.lock held; the row is written by the next flush()
+    def _save_to_disk(self, key, translation):
+        self._ensure_db()
+        if self.db is None:
+            return
+        self.pending_writes[key] = translation
+        self.pending_touches.pop(key, None)
+
+    # Write the entries and last-used times queued since the last flush in one transaction
+    def flush(self):
+        with self.lock:
+            writes, self.pending_writes = self.pending_writes, {}
+            touches, self.pending_touches = self.pending_touches, {}
+        if not writes and not touches:
+            return
+        now = time.time()
+        with self.db_lock:
+            if self.db is None:
+                return
+            try:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO translations (source, target, text, translation, last_used)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [key + (translation, now) for key, translation in writes.items()],
+                )
+                self.db.executemany(
+                    "UPDATE translations SET last_used = ? WHERE source = ? AND target = ? AND text = ?",
+                    [(last_used,) + key for key, last_used in touches.items()],
+                )
+                # Trim the least recently used rows every now and then rather than on every write
+                previous_writes = self.disk_writes
+                self.disk_writes += len(writes)
+                if self.disk_writes // 1000 != previous_writes // 1000:
+                    self.db.execute(
+                        "DELETE FROM translations WHERE rowid IN ("
+                        " SELECT rowid FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,),
+                    )
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Translation cache write error: {e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    # Look up a cached translation, returns None on a miss
+    def get(self, source, target, text):
+        key = self._key(source, target, text)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            translation = self._load_from_disk(key)
+            if translation is not None:
+                self._remember(key, translation)
+                self.hits += 1
+                self.disk_hits += 1
+            return translation
+
+    def put(self, source, target, text, translation):
+        key = self._key(source, target, text)
+        with self.lock:
+            self._remember(key, translation)
+            self._save_to_disk(key, translation)
+
+    # Return the cached translation of text, or call translate_func(text) and cache its result.
+    # Exceptions from translate_func are passed on and nothing is cached for that text.
+    def translate(self, source, target, text, translate_func):
+        translation = self.get(source, target, text)
+        if translation is not None:
+            return translation
+
+        started = time.perf_counter()
+        translation = translate_func(text)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.misses += 1
+            self.miss_seconds += elapsed
+        if translation is not None:
+            self.put(source, target, text, translation)
+        return translation
+
+    # Same as translate() for a list of texts; the misses go to translate_batch_func(texts) in one call
+    def translate_many(self, source, target, texts, translate_batch_func):
+        translations = [self.get(source, target, text) for text in texts]
+        missing = [index for index, translation in enumerate(translations) if translation is None]
+        if not missing:
+            return translations
+
+        started = time.perf_counter()
+        missing_translations = translate_batch_func([texts[index] for index in missing])
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.misses += len(missing)
+            self.miss_seconds += elapsed
+        for index, translation in zip(missing, missing_translations):
+            translations[index] = translation
+            if translation is not None:
+                self.put(source, target, texts[index], translation)
+        return translations
+
+    # Hit/miss counters plus an estimate of the translator time the hits saved
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            average_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self.entries),
+                'evictions': self.evictions,
+                'translate_seconds': round(self.miss_seconds, 3),
+                'saved_seconds_estimate': round(self.hits * average_miss, 3),
+            }
+
+    def close(self):
+        with self.lock:
+            self.db_path = None  # Never opened, and not to be opened any more
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(self.flush_interval + 1)
+        self.flush()
+        with self.db_lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
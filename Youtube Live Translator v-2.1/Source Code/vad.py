@@ -0,0 +1,177 @@
+from collections import namedtuple
+import numpy as np
+
+# One stretch of speech cut out of the stream. start and end are seconds since the segmenter started.
+Segment = namedtuple('Segment', ['audio', 'start', 'end'])
+
+
+# Energy based voice activity segmenter for 16-bit mono PCM.
+# Frame energies are computed with NumPy for a whole chunk at once. A segment is closed at the first
+# pause once it is at least min_segment long, or forcibly at max_segment; silence between segments
+# is dropped so it never reaches the recognizer.
+# feed() accepts bytes or a memoryview and does not keep a reference to it: speech frames are copied
+# into a preallocated segment buffer, silence is never copied except for the short padding before speech.
+class SpeechSegmenter:
+    def __init__(self, sample_rate=16000, frame_ms=30, min_segment=1.0, max_segment=15.0, pause=0.6,
+                 padding=0.2, min_speech=0.15, threshold_ratio=3.0, min_threshold=300.0):
+        self.sample_rate = sample_rate
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.frame_bytes = self.frame_samples * 2
+        self.frame_seconds = self.frame_samples / sample_rate
+        self.min_frames = max(1, int(min_segment / self.frame_seconds))
+        self.max_frames = max(self.min_frames, int(max_segment / self.frame_seconds))
+        self.pause_frames = max(1, int(pause / self.frame_seconds))
+        self.padding_frames = int(padding / self.frame_seconds)
+        self.min_speech_frames = max(1, int(min_speech / self.frame_seconds))
+        # A frame is speech when its RMS is threshold_ratio times the noise floor, and never below min_threshold
+        self.threshold_ratio = threshold_ratio
+        self.min_threshold = min_threshold
+        self.noise_floor = min_threshold / threshold_ratio
+
+        # Partial frame left over from the previous chunk
+        self.pending = bytearray(self.frame_bytes)
+        self.pending_bytes = 0
+        self.frames_seen = 0
+        # Ring of the last few silent frames, prepended when speech starts
+        self.pre_roll_slots = max(1, self.padding_frames)
+        self.pre_roll = bytearray(self.pre_roll_slots * self.frame_bytes)
+        self.pre_roll_count = 0
+        self.pre_roll_next = 0
+        # The segment being collected
+        self.segment = bytearray((self.max_frames + self.pre_roll_slots) * self.frame_bytes)
+        self.segment_frames = 0
+        self.segment_start = 0
+        self.voiced_frames = 0
+        self.silence_run = 0
+
+        self.segments = 0
+        self.dropped_seconds = 0.0
+
+    # RMS energy of every complete frame in one vectorized pass
+    def frame_energies(self, samples):
+        frames = samples.reshape(-1, self.frame_samples).astype(np.float32)
+        return np.sqrt(np.mean(frames * frames, axis=1))
+
+    def _update_noise_floor(self, energies, voiced):
+        quiet = energies[~voiced]
+        if quiet.size:
+            # Follow the background level slowly so a loud passage does not raise the threshold
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(np.median(quiet))
+
+    def _append_frame(self, frame):
+        offset = self.segment_frames * self.frame_bytes
+        self.segment[offset:offset + self.frame_bytes] = frame
+        self.segment_frames += 1
+
+    def _remember_silence(self, frame):
+        if self.pre_roll_count == self.pre_roll_slots:
+            self.dropped_seconds += self.frame_seconds
+        else:
+            self.pre_roll_count += 1
+        offset = self.pre_roll_next * self.frame_bytes
+        self.pre_roll[offset:offset + self.frame_bytes] = frame
+        self.pre_roll_next = (self.pre_roll_next + 1) % self.pre_roll_slots
+
+    def _start_segment(self, frame, frame_number):
+        self.segment_frames = 0
+        oldest = (self.pre_roll_next - self.pre_roll_count) % self.pre_roll_slots
+        for slot in range(self.pre_roll_count):
+            offset = ((oldest + slot) % self.pre_roll_slots) * self.frame_bytes
+            self._append_frame(self.pre_roll[offset:offset + self.frame_bytes])
+        self.segment_start = frame_number - self.pre_roll_count
+        self.pre_roll_count = 0
+        self._append_frame(frame)
+        self.voiced_frames = 1
+        self.silence_run = 0
+
+    def _close_segment(self, keep_silence):
+        frame_count = self.segment_frames
+        if keep_silence < self.silence_run:
+            frame_count -= self.silence_run - keep_silence
+        start = self.segment_start * self.frame_seconds
+        end = start + frame_count * self.frame_seconds
+        segment = None
+        if self.voiced_frames >= self.min_speech_frames:
+            segment = Segment(bytes(self.segment[:frame_count * self.frame_bytes]), start, end)
+            self.segments += 1
+        else:
+            self.dropped_seconds += self.segment_frames * self.frame_seconds
+        self.segment_frames = 0
+        self.voiced_frames = 0
+        self.silence_run = 0
+        return segment
+
+    # Run the segmentation state machine over whole frames
+    def _process(self, frames):
+        samples = np.frombuffer(frames, dtype=np.int16)
+        energies = self.frame_energies(samples)
+        threshold = max(self.min_threshold, self.noise_floor * self.threshold_ratio)
+        voiced = energies > threshold
+        self._update_noise_floor(energies, voiced)
+
+        completed = []
+        for index, is_speech in enumerate(voiced.tolist()):
+            frame = frames[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+            frame_number = self.frames_seen + index
+
+            if not self.segment_frames:
+                if is_speech:
+                    self._start_segment(frame, frame_number)
+                else:
+                    self._remember_silence(frame)
+                continue
+
+            self._append_frame(frame)
+            if is_speech:
+                self.voiced_frames += 1
+                self.silence_run = 0
+            else:
+                self.silence_run += 1
+
+            segment = None
+            speech_frames = self.segment_frames - self.silence_run
+            if self.silence_run >= self.pause_frames and speech_frames >= self.min_frames:
+                segment = self._close_segment(keep_silence=self.padding_frames)
+            elif self.silence_run >= self.pause_frames and self.segment_frames >= self.min_frames:
+                # Short utterance: keep just enough of the trailing silence to reach min_segment
+                segment = self._close_segment(keep_silence=max(self.padding_frames, self.min_frames - speech_frames))
+            elif self.segment_frames >= self.max_frames:
+                segment = self._close_segment(keep_silence=self.silence_run)
+            if segment is not None:
+                completed.append(segment)
+
+        self.frames_seen += len(voiced)
+        return completed
+
+    # Feed raw PCM (bytes or memoryview), returns the list of segments that were completed by this chunk
+    def feed(self, pcm):
+        view = memoryview(pcm).cast('B')
+        completed = []
+
+        # Finish the frame left over from the previous chunk first
+        if self.pending_bytes:
+            needed = self.frame_bytes - self.pending_bytes
+            taken = min(needed, len(view))
+            self.pending[self.pending_bytes:self.pending_bytes + taken] = view[:taken]
+            self.pending_bytes += taken
+            view = view[taken:]
+            if self.pending_bytes < self.frame_bytes:
+                return completed
+            self.pending_bytes = 0
+            completed += self._process(memoryview(self.pending))
+
+        usable = len(view) - len(view) % self.frame_bytes
+        if usable:
+            completed += self._process(view[:usable])
+        remainder = len(view) - usable
+        if remainder:
+            self.pending[:remainder] = view[usable:]
+            self.pending_bytes = remainder
+        return completed
+
+    # Close whatever is still open, e.g. when the stream ends
+    def flush(self):
+        if not self.segment_frames:
+            return []
+        segment = self._close_segment(keep_silence=self.padding_frames)
+        return [segment] if segment is not None else []
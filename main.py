@@ -1,103 +1,218 @@
+import os
+import sys
 import subprocess
 import tkinter as tk
 from tkinter.scrolledtext import ScrolledText
 from tkinter import ttk
 import speech_recognition as sr
 from googletrans import Translator
-import yt_dlp
 import threading
-import io
-from pydub import AudioSegment
-from pydub.playback import play
+
+# Shared helper modules live next to the v2.1 source
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Youtube Live Translator v-2.1', 'Source Code'))
+from translation_cache import TranslationCache
+from vad import SpeechSegmenter
+from ordered_pool import OrderedWorkerPool
+from render_queue import TranscriptRenderer
+from stream_resolver import StreamResolver
+from supervisor import CaptureSupervisor
+from playback import AudioPlayer
+from broadcast import CaptionBroadcaster
+from fanout import FanoutTranslator, parse_targets
+
+# Speech segmentation: a segment is sent for recognition at the first pause of at least VAD_PAUSE seconds
+# once it is VAD_MIN_SEGMENT long, and is cut at VAD_MAX_SEGMENT seconds no matter what.
+VAD_MIN_SEGMENT = 1.0
+VAD_MAX_SEGMENT = 15.0
+VAD_PAUSE = 0.6
+
+# Recognition/translation requests that may be outstanding at once, and how long each one may take
+# before it is skipped. Results are still shown in stream order.
+RECOGNITION_CONCURRENCY = 4
+RECOGNITION_TIMEOUT = 30
+
+# Languages the captions are translated into, e.g. ['en', 'uk', 'pl']. Each segment is recognized once
+# and translated into all of them at the same time.
+TARGET_LANGUAGES = ['en']
+
+# Playback runs behind the stream by at most this many seconds, older audio is skipped to catch up
+PLAYBACK_MAX_BUFFER = 5.0
+
+# Set to a port (e.g. 8765) to push captions to browsers and OBS overlays at http://127.0.0.1:<port>/
+BROADCAST_PORT = None
+broadcaster = None
+
+# Transcript redraws per second and lines kept in the text box
+RENDER_MAX_FPS = 10
+RENDER_MAX_LINES = 2000
+
+# Translation memo cache, saves a googletrans request for every phrase that has been seen before.
+# Set TRANSLATION_CACHE_DB to None to keep the cache in memory only.
+TRANSLATION_CACHE_SIZE = 4096
+TRANSLATION_CACHE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'translation_cache.sqlite3')
+translation_cache = TranslationCache(max_entries=TRANSLATION_CACHE_SIZE, db_path=TRANSLATION_CACHE_DB)
+
+# Resolved stream URLs are reused on reconnect until they are about to expire.
+# The cheapest audio-only format of at least STREAM_MIN_AUDIO_BITRATE kbit/s is preferred.
+STREAM_MIN_AUDIO_BITRATE = 48
+stream_resolver = StreamResolver(min_audio_bitrate=STREAM_MIN_AUDIO_BITRATE)
+
+# Seconds to wait before reconnecting, doubled after every failed attempt up to the maximum
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
 
 # Get audio stream from YouTube live stream using yt-dlp
-def get_audio_stream(youtube_url):
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'quiet': True,
-        'no_warnings': True,
-        'force_generic_extractor': True,
-    }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(youtube_url, download=False)
-        formats = info_dict.get('formats', None)
-        for f in formats:
-            if f.get('acodec') != 'none':  # Ensuring it's an audio format
-                return f['url']
-
-# Stream and process the audio
-def stream_audio_to_text(youtube_url, gui_text_widget, status_label, language_code, playback_toggle):
-    while True:
-        try:
-            stream_url = get_audio_stream(youtube_url)
-
-            ffmpeg_command = [
-                'ffmpeg',
-                '-i', stream_url,
-                '-af', 'volume=2.0',
-                '-f', 'wav',
-                '-acodec', 'pcm_s16le',
-                '-ar', '16000',
-                '-ac', '1',
-                'pipe:1'
-            ]
-
-            ffmpeg_process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
-            recognizer = sr.Recognizer()
-            translator = Translator()
-
-            buffer_size = 16000 * 2 * 15  # 15 seconds of audio
-            audio_buffer = io.BytesIO()
-
-            def play_audio(audio_segment):
-                play(audio_segment)
-
-            while True:
-                try:
-                    status_label.config(text="Listening to stream...")
-
-                    raw_audio = ffmpeg_process.stdout.read(buffer_size)
-                    if not raw_audio:
-                        raise RuntimeError("Stream interrupted")
-
-                    audio_buffer.write(raw_audio)
-
-                    if audio_buffer.tell() >= buffer_size:
-                        audio_buffer.seek(0)
-                        audio_data = sr.AudioData(audio_buffer.read(), 16000, 2)
-                        audio_buffer = io.BytesIO()  # Reset buffer
-
-                        if playback_toggle.get():
-                            audio_segment = AudioSegment(data=audio_data.get_wav_data(), sample_width=2, frame_rate=16000, channels=1)
-                            play_audio(audio_segment)
-
-                        original_text = recognizer.recognize_google(audio_data, language=language_code)
-                        translated_text = translator.translate(original_text, dest='en').text
-
-                        gui_text_widget.config(state=tk.NORMAL)
-                        gui_text_widget.insert(tk.END, f"Heard: {original_text}\n")
-                        gui_text_widget.insert(tk.END, f"Translated: {translated_text}\n\n")
-                        gui_text_widget.config(state=tk.DISABLED)
-                        gui_text_widget.yview(tk.END)
-
-                except sr.UnknownValueError:
-                    status_label.config(text="Could not understand audio")
-                except sr.RequestError as e:
-                    status_label.config(text=f"Could not request results; {e}")
-                except Exception as e:
-                    status_label.config(text=f"An error occurred: {e}")
-                    break
-
-        except Exception as e:
-            status_label.config(text="Connection lost, attempting to reconnect...")
-            continue
+def get_audio_stream(youtube_url, refresh=False):
+    return stream_resolver.resolve(youtube_url, refresh=refresh)
+
+# Stream and process the audio.
+# Results are handed to on_event as dicts, the same shape the v2.1 engine uses:
+#   {'type': 'final', 'recognized': ..., 'translated': ..., 'translations': ...} and {'type': 'status', 'text': ...}
+# 'translations' is {language: text} for every one of target_languages (default TARGET_LANGUAGES),
+# 'translated' the first language's text.
+# playback_enabled is called before each chunk to check whether audio should be played.
+# Playback goes to playback_sink (see playback.py, e.g. NullSink or WaveFileSink), or the speakers by default.
+# recognize(audio_data) and translate(text, target_language) default to Google; pass your own to use another service.
+def stream_audio_to_text(youtube_url, language_code, on_event, playback_enabled=lambda: False, stop_event=None,
+                         recognize=None, translate=None, playback_sink=None, target_languages=None):
+    def status(text):
+        on_event({'type': 'status', 'text': text})
+
+    if recognize is None:
+        recognizer = sr.Recognizer()
+        recognizer.operation_timeout = RECOGNITION_TIMEOUT
+
+        def recognize(audio_data):
+            return recognizer.recognize_google(audio_data, language=language_code)
+
+    if translate is None:
+        translator = Translator()
+
+        def translate(text, target_language):
+            return translator.translate(text, dest=target_language).text
+
+    source_language = language_code.split('-')[0]
+
+    def translate_texts(texts, target_language, source_language):
+        return [translation_cache.translate(source_language, target_language, text,
+                                            lambda uncached_text: translate(uncached_text, target_language))
+                for text in texts]
+
+    # Google translates every pair directly, nothing has to go through English
+    fanout = FanoutTranslator(translate_texts, parse_targets(target_languages or TARGET_LANGUAGES),
+                              has_direct=lambda source, target: True)
+
+    # Plays on its own thread from its own buffer, so recognition never waits for the speakers
+    audio_player = AudioPlayer(playback_sink, sample_rate=16000, max_buffer_seconds=PLAYBACK_MAX_BUFFER)
+
+    def listening_status():
+        cache_stats = translation_cache.stats()
+        status(f"Listening to stream... (translation cache hits: "
+               f"{cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})")
+
+    # Runs on a pool thread, several segments can be in flight at once
+    def process_segment(speech_segment):
+        audio_data = sr.AudioData(speech_segment.audio, 16000, 2)
+        original_text = recognize(audio_data)
+        translations = fanout.translate_many([original_text], source_language)
+        return original_text, {target: texts[0] for target, texts in translations.items()}
+
+    # Called in stream order, whatever order the requests finished in
+    def deliver_result(speech_segment, result, error):
+        if error is None:
+            original_text, translations = result
+            on_event({'type': 'final', 'recognized': original_text, 'translated': translations[fanout.targets[0]],
+                      'translations': translations, 'start': speech_segment.start, 'end': speech_segment.end})
+            listening_status()
+        elif isinstance(error, sr.UnknownValueError):
+            status("Could not understand audio")
+        elif isinstance(error, sr.RequestError):
+            status(f"Could not request results; {error}")
+        elif isinstance(error, TimeoutError):
+            status(f"Skipped a segment: {error}")
+        else:
+            status(f"An error occurred: {error}")
+
+    requests_pool = OrderedWorkerPool(process_segment, deliver_result, max_in_flight=RECOGNITION_CONCURRENCY,
+                                      timeout=RECOGNITION_TIMEOUT)
+
+    # Started and restarted by the capture supervisor, which owns the process
+    def start_ffmpeg(refresh):
+        stream_url = get_audio_stream(youtube_url, refresh=refresh)
+
+        ffmpeg_command = [
+            'ffmpeg',
+            '-i', stream_url,
+            '-af', 'volume=2.0',
+            '-f', 's16le',
+            '-acodec', 'pcm_s16le',
+            '-ar', '16000',
+            '-ac', '1',
+            'pipe:1'
+        ]
+
+        # Unbuffered so the reader can readinto() straight from the pipe
+        return subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+
+    read_size = 16000 * 2 // 4  # Read a quarter second of audio at a time
+    # The segmenter copies out what it keeps, so one reused buffer is all the reading needs.
+    # Reconnects back off from RECONNECT_BASE_DELAY to RECONNECT_MAX_DELAY seconds and never give up.
+    capture = CaptureSupervisor(start_ffmpeg, chunk_size=read_size, slots=1, max_retries=None,
+                                base_delay=RECONNECT_BASE_DELAY, max_delay=RECONNECT_MAX_DELAY,
+                                on_status=status, stop_event=stop_event)
+    segmenter = None
+    connection = None
+    try:
+        capture.start()
+        while True:
+            raw_audio = capture.read()
+            if raw_audio is None:
+                break
+
+            if capture.connection != connection:
+                # A new ffmpeg: finish what the old one started, never join audio across the gap
+                if segmenter is not None:
+                    for speech_segment in segmenter.flush():
+                        requests_pool.submit(speech_segment)
+                connection = capture.connection
+                segmenter = SpeechSegmenter(sample_rate=16000, min_segment=VAD_MIN_SEGMENT,
+                                            max_segment=VAD_MAX_SEGMENT, pause=VAD_PAUSE)
+                listening_status()
+
+            if playback_enabled():
+                audio_player.feed(raw_audio)
+
+            # Only whole utterances are recognized, the silence between them is dropped here
+            speech_segments = segmenter.feed(raw_audio)
+            capture.release(raw_audio)
+            for speech_segment in speech_segments:
+                # Blocks only once RECOGNITION_CONCURRENCY requests are already outstanding
+                requests_pool.submit(speech_segment)
+    finally:
+        capture.stop()
+        requests_pool.close()
+        fanout.close()
+        audio_player.close()
+
+# Shows stream events in the text box and status label.
+# Runs on worker threads, so it only queues the update; the renderer draws it from the Tk loop.
+def display_event(event):
+    if event['type'] == 'status':
+        renderer.set_status(event['text'])
+    elif len(event['translations']) > 1:
+        translated = ''.join(f"Translated ({language}): {text}\n" for language, text in event['translations'].items())
+        renderer.append(f"Heard: {event['recognized']}\n{translated}\n")
+    else:
+        renderer.append(f"Heard: {event['recognized']}\nTranslated: {event['translated']}\n\n")
+    if broadcaster is not None:
+        broadcaster.publish(event)
 
 # Trigger the start of the process
 def start_translation():
     youtube_url = url_entry.get()
     language_code = language_var.get()
 
-    translation_thread = threading.Thread(target=stream_audio_to_text, args=(youtube_url, output_text, status_label, language_code, playback_toggle))
+    translation_thread = threading.Thread(target=stream_audio_to_text, args=(youtube_url, language_code, display_event, playback_toggle.get))
     translation_thread.start()
 
 # Toggle the UI to minimalist mode
@@ -151,91 +266,102 @@ def toggle_minimalist_mode():
 
 # Close the application
 def close_application():
+    translation_cache.close()
+    renderer.stop()
     root.destroy()
 
-# Setup the GUI
-root = tk.Tk()
-root.title("Live YouTube Translation")
-root.geometry("850x550")
-root.configure(bg='#2c2f33')
-
-style = ttk.Style()
-style.theme_use('clam')
-style.configure('TLabel', background='#1e90ff', foreground='white')  # blue background, white text
-style.configure('TButton', background='#1e90ff', foreground='white')  #  blue background, white text
-style.configure('TCheckbutton', background='#2c2f33', foreground='white')  # White text
-style.configure('TEntry', fieldbackground='#23272a', foreground='white', insertcolor='white')  # Darker background, white text
-style.configure('TCombobox', fieldbackground='#23272a', background='#23272a', foreground='white')  # Darker background, white text
-
-top_frame = ttk.Frame(root, style='TLabel')
-top_frame.pack(pady=20, fill=tk.X, padx=20)
-
-# URL Entry
-url_label = ttk.Label(top_frame, text="YouTube URL:")
-url_label.pack(side=tk.LEFT, padx=5)
-
-url_entry = ttk.Entry(top_frame, width=50)
-url_entry.pack(side=tk.LEFT, padx=10)
-
-# Language Dropdown
-language_label = ttk.Label(top_frame, text="Language:")
-language_label.pack(side=tk.LEFT, padx=5)
-
-language_var = tk.StringVar()
-language_dropdown = ttk.Combobox(top_frame, textvariable=language_var, values=[
-    'ru-RU',  # Russian
-    'es-ES',  # Spanish
-    'fr-FR',  # French
-    'de-DE',  # German
-    'it-IT',  # Italian
-    'zh-CN',  # Chinese (Simplified)
-    'ja-JP',  # Japanese
-    'ko-KR',  # Korean
-    'pt-PT',  # Portuguese
-    'ar-SA',  # Arabic
-], state="readonly")
-language_dropdown.set('ru-RU')  # Default to Russian
-language_dropdown.pack(side=tk.LEFT, padx=10)
-
-# Start Button
-start_button = ttk.Button(top_frame, text="Start Translation", command=start_translation)
-start_button.pack(side=tk.LEFT, padx=10)
-
-# Playback Toggle
-playback_toggle = tk.BooleanVar()
-playback_button = ttk.Checkbutton(root, text="Audio Playback", variable=playback_toggle)
-playback_button.pack(pady=10)
-
-# Text Output
-output_text = ScrolledText(root, wrap=tk.WORD, height=15, width=70, state=tk.DISABLED, bg='#23272a', fg='white', insertbackground='white')  # White text
-output_text.pack(pady=10)
-
-# Status Label
-status_label = ttk.Label(root, text="Status: Waiting to start...")
-status_label.pack(pady=10)
-
-# Exit and Restore Buttons (initially hidden)
-exit_button = ttk.Button(root, text="X", command=close_application)
-restore_button = ttk.Button(root, text="Restore UI", command=toggle_minimalist_mode)
-
-# Binding hover event to show/hide the Exit and Restore buttons in minimalist mode only
-def show_buttons(event):
-    if not top_frame.winfo_ismapped():
-        exit_button.place(relx=0.95, rely=0.05, anchor=tk.NE)
-        restore_button.place(relx=0.85, rely=0.05, anchor=tk.NE)
-
-def hide_buttons(event):
-    if not top_frame.winfo_ismapped():
-        exit_button.place_forget()
-        restore_button.place_forget()
-
-
-root.bind('<Enter>', show_buttons)
-root.bind('<Leave>', hide_buttons)
-
-# Button to toggle minimalist mode
-minimalist_button = ttk.Button(root, text="Minimalist Mode", command=toggle_minimalist_mode)
-minimalist_button.pack(pady=5)
-
-
-root.mainloop()
+# Setup the GUI when run as a script, so the streaming code above can be imported on its own
+if __name__ == '__main__':
+    root = tk.Tk()
+    root.title("Live YouTube Translation")
+    root.geometry("850x550")
+    root.configure(bg='#2c2f33')
+
+    style = ttk.Style()
+    style.theme_use('clam')
+    style.configure('TLabel', background='#1e90ff', foreground='white')  # blue background, white text
+    style.configure('TButton', background='#1e90ff', foreground='white')  #  blue background, white text
+    style.configure('TCheckbutton', background='#2c2f33', foreground='white')  # White text
+    style.configure('TEntry', fieldbackground='#23272a', foreground='white', insertcolor='white')  # Darker background, white text
+    style.configure('TCombobox', fieldbackground='#23272a', background='#23272a', foreground='white')  # Darker background, white text
+
+    top_frame = ttk.Frame(root, style='TLabel')
+    top_frame.pack(pady=20, fill=tk.X, padx=20)
+
+    # URL Entry
+    url_label = ttk.Label(top_frame, text="YouTube URL:")
+    url_label.pack(side=tk.LEFT, padx=5)
+
+    url_entry = ttk.Entry(top_frame, width=50)
+    url_entry.pack(side=tk.LEFT, padx=10)
+
+    # Language Dropdown
+    language_label = ttk.Label(top_frame, text="Language:")
+    language_label.pack(side=tk.LEFT, padx=5)
+
+    language_var = tk.StringVar()
+    language_dropdown = ttk.Combobox(top_frame, textvariable=language_var, values=[
+        'ru-RU',  # Russian
+        'es-ES',  # Spanish
+        'fr-FR',  # French
+        'de-DE',  # German
+        'it-IT',  # Italian
+        'zh-CN',  # Chinese (Simplified)
+        'ja-JP',  # Japanese
+        'ko-KR',  # Korean
+        'pt-PT',  # Portuguese
+        'ar-SA',  # Arabic
+    ], state="readonly")
+    language_dropdown.set('ru-RU')  # Default to Russian
+    language_dropdown.pack(side=tk.LEFT, padx=10)
+
+    # Start Button
+    start_button = ttk.Button(top_frame, text="Start Translation", command=start_translation)
+    start_button.pack(side=tk.LEFT, padx=10)
+
+    # Playback Toggle
+    playback_toggle = tk.BooleanVar()
+    playback_button = ttk.Checkbutton(root, text="Audio Playback", variable=playback_toggle)
+    playback_button.pack(pady=10)
+
+    # Text Output
+    output_text = ScrolledText(root, wrap=tk.WORD, height=15, width=70, state=tk.DISABLED, bg='#23272a', fg='white', insertbackground='white')  # White text
+    output_text.pack(pady=10)
+
+    # Status Label
+    status_label = ttk.Label(root, text="Status: Waiting to start...")
+    status_label.pack(pady=10)
+
+    # Draws queued transcript updates from the Tk loop
+    renderer = TranscriptRenderer(root, output_text, status_label, max_fps=RENDER_MAX_FPS, max_lines=RENDER_MAX_LINES)
+    renderer.start()
+
+    # Every viewer gets the same serialized event, translation runs once however many are watching
+    if BROADCAST_PORT:
+        broadcaster = CaptionBroadcaster(BROADCAST_PORT).start()
+
+    # Exit and Restore Buttons (initially hidden)
+    exit_button = ttk.Button(root, text="X", command=close_application)
+    restore_button = ttk.Button(root, text="Restore UI", command=toggle_minimalist_mode)
+
+    # Binding hover event to show/hide the Exit and Restore buttons in minimalist mode only
+    def show_buttons(event):
+        if not top_frame.winfo_ismapped():
+            exit_button.place(relx=0.95, rely=0.05, anchor=tk.NE)
+            restore_button.place(relx=0.85, rely=0.05, anchor=tk.NE)
+
+    def hide_buttons(event):
+        if not top_frame.winfo_ismapped():
+            exit_button.place_forget()
+            restore_button.place_forget()
+
+
+    root.bind('<Enter>', show_buttons)
+    root.bind('<Leave>', hide_buttons)
+
+    # Button to toggle minimalist mode
+    minimalist_button = ttk.Button(root, text="Minimalist Mode", command=toggle_minimalist_mode)
+    minimalist_button.pack(pady=5)
+
+
+    root.mainloop()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The helper modules live next to the v2.1 source, main.py at the top of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'Youtube Live Translator v-2.1', 'Source Code'), ROOT]
@@ -0,0 +1,98 @@
+import sys
+import types
+import pathlib
+import pytest
+
+# Three texts with several sentences and a paragraph break, so splitting them differently shows
+TEXTS = ["Привет. Как дела?", "Один. Два. Три.", "Первая строка.\nВторая строка. Ещё одна."]
+
+
+# Sentencepiece-like tokenizer: words become '▁word' and decoding puts the spaces back
+class Tokenizer:
+    def encode(self, sentence):
+        return ['▁' + word for word in sentence.split()]
+
+    def decode(self, tokens):
+        return ''.join(tokens).replace('▁', ' ')
+
+
+# Stands in for CTranslate2: upper-cases every token and ends each sentence with its length,
+# so a sentence translated on its own comes out different from one translated with its neighbours
+class Translator:
+    def __init__(self):
+        self.batches = []
+
+    def translate_batch(self, tokenized, target_prefix=None, **options):
+        self.batches.append(tokenized)
+        return [types.SimpleNamespace(hypotheses=[(prefix[0:1] if target_prefix else []) +
+                                                  [token.upper() for token in tokens] + [f'▁<{len(tokens)}>']])
+                for tokens, prefix in zip(tokenized, target_prefix or [[]] * len(tokenized))]
+
+
+# Stand-in for stanza's tokenizer: a sentence ends after '.' or '?'
+def stanza_pipeline(text):
+    sentences, sentence = [], []
+    for word in text.split():
+        sentence.append(word)
+        if word.endswith(('.', '?')):
+            sentences.append(' '.join(sentence))
+            sentence = []
+    if sentence:
+        sentences.append(' '.join(sentence))
+    return types.SimpleNamespace(sentences=[types.SimpleNamespace(text=sentence) for sentence in sentences])
+
+
+# What Argos's PackageTranslation does for one text: paragraphs, then apply_packaged_translation on each
+class PackageTranslation:
+    def __init__(self, target_prefix=''):
+        self.pkg = types.SimpleNamespace(type='translate', from_code='ru', tokenizer=Tokenizer(),
+                                         target_prefix=target_prefix,
+                                         package_path=pathlib.Path('translate-ru_en'))
+        self.translator = Translator()
+
+    def translate(self, text):
+        value = ''
+        for paragraph in text.split('\n'):
+            sentences = [sentence.text for sentence in stanza_pipeline(paragraph).sentences]
+            tokenized = [self.pkg.tokenizer.encode(sentence) for sentence in sentences]
+            prefix = [[self.pkg.target_prefix]] * len(tokenized) if self.pkg.target_prefix else None
+            results = self.translator.translate_batch(tokenized, target_prefix=prefix)
+            translated = self.pkg.tokenizer.decode([token for result in results for token in result.hypotheses[0]])
+            if self.pkg.target_prefix and translated.startswith(self.pkg.target_prefix):
+                translated = translated[len(self.pkg.target_prefix):]
+            if translated.startswith(' '):
+                translated = translated[1:]
+            value = '\n'.join([value, translated])
+        return value.lstrip('\n')
+
+
+# Argos's wrapper around the package translation
+class CachedTranslation:
+    def __init__(self, underlying):
+        self.underlying = underlying
+
+    def translate(self, text):
+        return self.underlying.translate(text)
+
+
+@pytest.mark.parametrize('wrapped', [False, True])
+@pytest.mark.parametrize('target_prefix', ['', '__en__'])
+def test_batch_matches_one_text_at_a_time(monkeypatch, wrapped, target_prefix):
+    pytest.importorskip('yt_dlp')
+    import engine
+
+    settings = types.SimpleNamespace(device='cpu', stanza_available=True)
+    monkeypatch.setitem(sys.modules, 'argostranslate', types.SimpleNamespace(settings=settings))
+    monkeypatch.setitem(sys.modules, 'argostranslate.settings', settings)
+    monkeypatch.setitem(sys.modules, 'stanza', types.SimpleNamespace(Pipeline=lambda **options: stanza_pipeline))
+    package_translation = PackageTranslation(target_prefix)
+    translation = CachedTranslation(package_translation) if wrapped else package_translation
+    monkeypatch.setattr(engine.model_registry, 'get_translation', lambda from_code, to_code: translation)
+
+    batched = engine.argos_translate_batch(TEXTS, 'ru', 'en')
+    # All the sentences of all the texts went to the translator in one batch
+    assert len(package_translation.translator.batches) == 1
+    assert len(package_translation.translator.batches[0]) == 8
+    assert batched == [translation.translate(text) for text in TEXTS]
+    if not target_prefix:
+        assert batched[1] == "ОДИН. <1> ДВА. <1> ТРИ. <1>"
@@ -0,0 +1,99 @@
+import io
+import time
+import numpy as np
+import pytest
+from load_shedding import LoadShedder, DROP_OLDEST, FEED, DROP
+
+BYTES_PER_SECOND = 32000
+CHUNK = 4096
+TONE = (np.sin(np.arange(16000) * 2 * np.pi * 220 / 16000) * 8000).astype(np.int16).tobytes()  # One second
+
+
+def test_drops_until_caught_up():
+    backlog = [12.0]
+    shedder = LoadShedder(lambda: backlog[0], policies=(DROP_OLDEST,), budget=1.0)
+    chunk = TONE[:CHUNK]
+    actions = []
+    for _ in range(200):
+        action = shedder.check(chunk)
+        actions.append(action)
+        if action == DROP:
+            backlog[0] -= CHUNK / BYTES_PER_SECOND  # Dropped audio comes off the backlog
+    assert actions[0] == DROP and actions[-1] == FEED
+    assert not shedder.shedding
+    assert 11.0 < shedder.dropped_seconds < 12.0
+
+
+def test_stops_dropping_when_it_does_not_bring_the_lag_down():
+    backlog = [12.0]
+    shedder = LoadShedder(lambda: backlog[0], policies=(DROP_OLDEST,), budget=1.0)
+    chunk = TONE[:CHUNK]
+    actions = [shedder.check(chunk) for _ in range(50)]
+    # A budget's worth of audio is dropped, then the rest is fed again
+    assert actions.count(DROP) == 8
+    assert actions[-1] == FEED
+    assert shedder.shedding and not shedder.dropping
+
+    # Dropping starts again once the backlog has been under max_lag and goes over it again
+    backlog[0] = 1.5
+    assert shedder.check(chunk) == FEED
+    backlog[0] = 3.0
+    assert shedder.check(chunk) == DROP
+
+
+# ffmpeg stand-in that hands out speech (a second of tone, a second of silence, ...) at live speed,
+# except that the source goes quiet for stall seconds after stall_at seconds
+class StallingFFmpeg:
+    def __init__(self, seconds, stall_at, stall):
+        self.stdout = self
+        self.stderr = None
+        self.audio = io.BytesIO((TONE + b'\0' * BYTES_PER_SECOND) * (seconds // 2))
+        self.stall_at = stall_at
+        self.stall = stall
+        self.started = None
+
+    def readinto(self, buffer):
+        if self.started is None:
+            self.started = time.monotonic()
+        position = self.audio.tell() / BYTES_PER_SECOND
+        delay = self.started + position + len(buffer) / BYTES_PER_SECOND - time.monotonic()
+        if position >= self.stall_at:
+            delay += self.stall
+        if delay > 0:
+            time.sleep(delay)
+        return self.audio.readinto(buffer)
+
+    def poll(self):
+        return None
+
+    def terminate(self):
+        pass
+
+    def wait(self, timeout=None):
+        return 0
+
+    kill = terminate
+
+
+def test_engine_catches_up_after_the_stream_stalls(monkeypatch):
+    pytest.importorskip('yt_dlp')
+    import engine
+    import benchmark
+    from batching import TranslationBatcher
+    from translation_cache import TranslationCache
+
+    monkeypatch.setattr(engine, 'translation_cache', TranslationCache())
+    monkeypatch.setattr(engine, 'translation_batcher', TranslationBatcher(benchmark.stub_translate_batch))
+    finals = []
+    replay = benchmark.ReplayEngine(StallingFFmpeg(seconds=6, stall_at=2, stall=2.0), stub=True,
+                                    latency_budget=0.5, on_event=lambda event: finals.append(event)
+                                    if event['type'] in ('final', 'notice') else None)
+    replay.start()
+    replay.join(20)
+
+    assert not replay.is_running()
+    stats = replay.shedder.stats()
+    assert stats['dropped_seconds'] == 0 and not stats['dropping']
+    assert stats['lag_seconds'] < 0.5
+    # Speech after the stall is still recognized
+    assert sum(1 for event in finals if event['type'] == 'final' and event['recognized']) == 3
@@ -0,0 +1,101 @@
+import io
+import os
+import time
+import numpy as np
+import pytest
+from transcript_export import TranscriptWriter
+
+BYTES_PER_SECOND = 32000
+TONE = (np.sin(np.arange(16000) * 2 * np.pi * 220 / 16000) * 8000).astype(np.int16).tobytes()  # One second
+
+
+# ffmpeg stand-in that hands out a second of tone and a second of silence at live speed
+class LiveFFmpeg:
+    def __init__(self):
+        self.stdout = self
+        self.stderr = None
+        self.audio = io.BytesIO(TONE + b'\0' * BYTES_PER_SECOND)
+        self.started = None
+
+    def readinto(self, buffer):
+        if self.started is None:
+            self.started = time.monotonic()
+        delay = self.started + (self.audio.tell() + len(buffer)) / BYTES_PER_SECOND - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return self.audio.readinto(buffer)
+
+    def poll(self):
+        return None
+
+    def terminate(self):
+        pass
+
+    def wait(self, timeout=None):
+        return 0
+
+    kill = terminate
+
+
+def test_cue_times_include_the_audio_lost_to_a_reconnect(monkeypatch):
+    pytest.importorskip('yt_dlp')
+    import engine
+    import benchmark
+    from batching import TranslationBatcher
+    from translation_cache import TranslationCache
+
+    # Plays one process per connection, then fails to start any more
+    class ReconnectingEngine(benchmark.ReplayEngine):
+        def __init__(self, processes, **kwargs):
+            super().__init__(None, stub=True, **kwargs)
+            self.max_retries = 1
+            self.processes = processes
+
+        def _start_ffmpeg_process(self, refresh=False):
+            return self.processes.pop(0)
+
+    monkeypatch.setattr(engine, 'translation_cache', TranslationCache())
+    monkeypatch.setattr(engine, 'translation_batcher', TranslationBatcher(benchmark.stub_translate_batch))
+    monkeypatch.setattr(engine, 'RECONNECT_BASE_DELAY', 0.5)
+    finals = []
+    replay = ReconnectingEngine([LiveFFmpeg(), LiveFFmpeg()],
+                                on_event=lambda event: finals.append(event) if event['type'] == 'final' else None)
+    replay.start()
+    replay.join(20)
+
+    assert not replay.is_running()
+    lost = replay.capture.lost_audio_seconds
+    assert lost > 0.2
+    # The stub recognizer has no word timings, so a result ends where recognition was when it came out
+    ends = [event['end'] for event in finals if event['recognized']]
+    assert len(ends) == 2
+    # The second tone comes two seconds of audio plus the outage after the first
+    assert abs(ends[1] - ends[0] - (2.0 + lost)) < 0.3
+
+
+def test_new_session_starts_a_new_caption_file(tmp_path):
+    path = str(tmp_path / 'captions.srt')
+    for text in ("first session", "second session"):
+        writer = TranscriptWriter(path, flush_interval=60)
+        writer.write({'type': 'final', 'recognized': text, 'translated': '', 'start': 1.0, 'end': 2.0})
+        writer.close()
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 2 and 'captions.srt' in files
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == "1\n00:00:01,000 --> 00:00:02,000\nsecond session\n\n"
+    files.remove('captions.srt')
+    with open(tmp_path / files[0], encoding='utf-8') as f:
+        assert "first session" in f.read()
+
+
+def test_jsonl_transcript_is_appended_to(tmp_path):
+    path = str(tmp_path / 'transcript.jsonl')
+    for text in ("first session", "second session"):
+        writer = TranscriptWriter(path, flush_interval=60)
+        writer.write({'type': 'final', 'recognized': text, 'translated': '', 'start': 1.0, 'end': 2.0})
+        writer.close()
+
+    assert os.listdir(tmp_path) == ['transcript.jsonl']
+    with open(path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
@@ -0,0 +1,158 @@
+import io
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+from ordered_pool import OrderedWorkerPool
+
+
+# Local stand-in for a speech recognition service. POST the audio to /recognize and it answers
+# {"text": ...} after the X-Delay seconds the request asks for, so a test can make later requests
+# finish first. The text names the request (X-Name) and says how many bytes of audio it got.
+class StubRecognizer:
+    def __init__(self):
+        stub = self
+        self.requests = []
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                audio = self.rfile.read(int(self.headers['Content-Length']))
+                with stub.lock:
+                    stub.requests.append(audio)
+                threading.Event().wait(float(self.headers.get('X-Delay', 0)))
+                body = json.dumps({'text': f"{self.headers.get('X-Name', 'speech')} ({len(audio)} bytes)"}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/recognize"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def recognize(self, audio, name='speech', delay=0.0, timeout=10):
+        request = urllib.request.Request(self.url, data=bytes(audio), headers={'X-Name': name, 'X-Delay': str(delay)})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)['text']
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_recognizer():
+    stub = StubRecognizer()
+    yield stub
+    stub.close()
+
+
+def test_results_arrive_in_stream_order_when_requests_finish_out_of_order(stub_recognizer):
+    delivered = []
+    # The first segment takes longest, so the stub answers them in reverse
+    segments = [(f"segment {index}", 0.3 - index * 0.1, b'\1\0' * (index + 1)) for index in range(4)]
+
+    def worker(segment):
+        name, delay, audio = segment
+        return stub_recognizer.recognize(audio, name=name, delay=delay)
+
+    pool = OrderedWorkerPool(worker, lambda segment, result, error: delivered.append((result, error)),
+                             max_in_flight=4, timeout=5)
+    for segment in segments:
+        pool.submit(segment)
+    pool.close()
+
+    assert delivered == [(f"segment {index} ({(index + 1) * 2} bytes)", None) for index in range(4)]
+    assert len(stub_recognizer.requests) == 4
+
+
+def test_slow_request_is_skipped_without_holding_up_the_rest(stub_recognizer):
+    delivered = []
+
+    def worker(segment):
+        name, delay = segment
+        return stub_recognizer.recognize(b'\0\0', name=name, delay=delay)
+
+    def on_result(segment, result, error):
+        delivered.append((segment[0], result, type(error)))
+
+    pool = OrderedWorkerPool(worker, on_result, max_in_flight=2, timeout=0.3)
+    for segment in [('stuck', 2.0), ('next', 0.0), ('last', 0.0)]:
+        pool.submit(segment)
+    pool.close()
+
+    assert delivered == [('stuck', None, TimeoutError),
+                         ('next', 'next (2 bytes)', type(None)),
+                         ('last', 'last (2 bytes)', type(None))]
+    assert pool.timed_out == 1
+
+
+# ffmpeg stand-in for main.py: a burst of tone per utterance, each followed by a second of silence
+class FakeFFmpeg:
+    def __init__(self, utterances=0):
+        tone = (np.sin(np.arange(16000 * 1.5) * 2 * np.pi * 220 / 16000) * 8000).astype(np.int16).tobytes()
+        self.stdout = io.BytesIO((tone + b'\0' * 32000) * utterances)
+        self.stderr = None
+
+    def poll(self):
+        return 0
+
+    def terminate(self):
+        pass
+
+    def wait(self, timeout=None):
+        return 0
+
+    def kill(self):
+        pass
+
+
+def test_main_round_trip_through_stub_recognizer(stub_recognizer, monkeypatch):
+    pytest.importorskip('speech_recognition')
+    pytest.importorskip('googletrans')
+    pytest.importorskip('yt_dlp')
+    import main
+    from translation_cache import TranslationCache
+
+    processes = [FakeFFmpeg(utterances=2)]
+    monkeypatch.setattr(main, 'get_audio_stream', lambda url, refresh=False: 'stub://stream')
+    monkeypatch.setattr(main.subprocess, 'Popen', lambda *args, **kwargs: processes.pop(0) if processes else FakeFFmpeg())
+    monkeypatch.setattr(main, 'translation_cache', TranslationCache())
+    monkeypatch.setattr(main, 'RECONNECT_BASE_DELAY', 0.01)
+
+    finals = []
+    stop_event = threading.Event()
+
+    def on_event(event):
+        if event['type'] == 'final':
+            finals.append(event)
+            if len(finals) == 2:
+                stop_event.set()
+
+    def recognize(audio_data):
+        return stub_recognizer.recognize(audio_data.get_raw_data())
+
+    thread = threading.Thread(target=main.stream_audio_to_text, args=('https://youtube.example/live', 'ru-RU', on_event),
+                              kwargs={'stop_event': stop_event, 'recognize': recognize, 'target_languages': ['en', 'uk'],
+                                      'translate': lambda text, target_language: f"{target_language}: {text.upper()}"})
+    thread.start()
+    thread.join(20)
+    stop_event.set()
+
+    assert not thread.is_alive()
+    assert len(stub_recognizer.requests) == 2
+    assert sorted(event['recognized'] for event in finals) == sorted(
+        f"speech ({len(audio)} bytes)" for audio in stub_recognizer.requests)
+    for event in finals:
+        assert event['translations'] == {'en': f"en: {event['recognized'].upper()}",
+                                         'uk': f"uk: {event['recognized'].upper()}"}
+        assert event['translated'] == event['translations']['en']
+    assert finals[0]['start'] < finals[0]['end'] <= finals[1]['start'] < finals[1]['end']
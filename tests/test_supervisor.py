@@ -0,0 +1,142 @@
+import io
+import time
+import threading
+from supervisor import CaptureSupervisor
+
+CHUNK = 4096
+
+
+# Stands in for ffmpeg: delivers chunks of silence, then dies as if the stream had dropped
+class FakeFFmpeg:
+    def __init__(self, chunks=0, exit_delay=0.0):
+        self.stdout = io.BytesIO(b'\0' * CHUNK * chunks)
+        self.stderr = None
+        self.exit_delay = exit_delay
+        self.terminated = threading.Event()
+
+    def poll(self):
+        return 0 if self.terminated.is_set() or not self.exit_delay else None
+
+    def terminate(self):
+        self.terminated.set()
+
+    def wait(self, timeout=None):
+        time.sleep(self.exit_delay)
+        return 0
+
+    def kill(self):
+        self.terminated.set()
+
+
+# start_process for the supervisor that plays back a script of processes (or exceptions), recording
+# the refresh flag of every attempt
+class ScriptedStarts:
+    def __init__(self, *script):
+        self.script = list(script)
+        self.refreshes = []
+
+    def __call__(self, refresh):
+        self.refreshes.append(refresh)
+        outcome = self.script.pop(0) if self.script else RuntimeError("stream is offline")
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def read_all(supervisor):
+    chunks = 0
+    while True:
+        chunk = supervisor.read()
+        if chunk is None:
+            return chunks
+        supervisor.release(chunk)
+        chunks += 1
+
+
+def test_backoff_doubles_up_to_the_maximum():
+    supervisor = CaptureSupervisor(ScriptedStarts(), base_delay=1.0, max_delay=4.0, jitter=0.0)
+    assert [supervisor.backoff_delay(failures) for failures in range(1, 6)] == [1.0, 2.0, 4.0, 4.0, 4.0]
+
+
+def test_backoff_jitter_only_shortens_the_delay():
+    supervisor = CaptureSupervisor(ScriptedStarts(), base_delay=2.0, jitter=0.5, random_func=lambda: 1.0)
+    assert supervisor.backoff_delay(1) == 1.0
+
+
+def test_first_retry_reuses_the_url_and_later_ones_refresh_it():
+    starts = ScriptedStarts(FakeFFmpeg(chunks=3), RuntimeError("yt-dlp failed"), FakeFFmpeg(chunks=2))
+    supervisor = CaptureSupervisor(starts, chunk_size=CHUNK, slots=2, max_retries=3, base_delay=0.01, jitter=0.0)
+    supervisor.start()
+
+    assert read_all(supervisor) == 5
+    # Start, retry with the cached URL, retry with a fresh one. The last process dies at the end of its
+    # audio, which starts a new outage: the cached URL once more, then fresh ones until out of retries.
+    assert starts.refreshes == [False, False, True, False, True, True]
+    assert supervisor.gave_up
+    stats = supervisor.stats()
+    assert stats['restarts'] == 1
+    assert stats['outages'] == 1
+    assert supervisor.connection == 2
+
+
+def test_gives_up_after_max_retries():
+    statuses = []
+    starts = ScriptedStarts()
+    supervisor = CaptureSupervisor(starts, chunk_size=CHUNK, max_retries=2, base_delay=0.01, jitter=0.0,
+                                   on_status=statuses.append)
+    supervisor.start()
+
+    assert supervisor.read() is None
+    assert supervisor.gave_up
+    # The failed start plus two retries
+    assert len(starts.refreshes) == 3
+    assert statuses[-1].endswith("stopped after 2 retries.")
+
+
+def test_stop_does_not_wait_for_ffmpeg_to_exit():
+    process = FakeFFmpeg(chunks=1, exit_delay=1.0)
+    supervisor = CaptureSupervisor(ScriptedStarts(process), chunk_size=CHUNK)
+    supervisor.start()
+
+    started = time.monotonic()
+    supervisor.stop()
+    assert time.monotonic() - started < 0.5
+    assert process.terminated.is_set()
+    assert supervisor.read() is None
+
+
+# stdout that hands out its chunks straight away, except that it goes quiet for stall seconds
+# before chunk number stall_at, like a stream whose source stopped sending for a while
+class StallingStream(io.BytesIO):
+    def __init__(self, chunks, stall_at, stall):
+        super().__init__(b'\0' * CHUNK * chunks)
+        self.stall_at = stall_at
+        self.stall = stall
+
+    def readinto(self, buffer):
+        if self.tell() == self.stall_at * CHUNK and self.stall:
+            time.sleep(self.stall)
+            self.stall = 0
+        return super().readinto(buffer)
+
+
+def test_stall_in_the_stream_is_not_counted_as_lag():
+    process = FakeFFmpeg()
+    process.stdout = StallingStream(chunks=4, stall_at=2, stall=0.5)
+    supervisor = CaptureSupervisor(ScriptedStarts(process), chunk_size=CHUNK)
+    supervisor.start()
+
+    for _ in range(4):
+        supervisor.release(supervisor.read())
+    # Everything received has been handled, so only the time since the last chunk counts
+    assert supervisor.lag_seconds(supervisor.received_seconds) < 0.1
+
+
+def test_audio_left_waiting_in_the_pipe_is_counted_as_lag():
+    supervisor = CaptureSupervisor(ScriptedStarts(FakeFFmpeg(chunks=4)), chunk_size=CHUNK)
+    supervisor.start()
+
+    supervisor.release(supervisor.read())
+    time.sleep(0.5)  # A slow consumer: the rest of the audio was there all along
+    supervisor.release(supervisor.read())
+    assert supervisor.lag_seconds(supervisor.received_seconds) > 0.3